@@ -3,6 +3,9 @@ import altair as alt
 import pandas as pd
 import pickle
 from PIL import Image
+from crawler_data import read_crawler_table
+from feature_store import CRAWLER_COLUMNS, FeatureStore, crawler_features
+from matchup_matrix import MatchupMatrix
 # encode blue=1 & red=0
 
 # style css
@@ -74,32 +77,6 @@ st.markdown('''
 
 
 
-# Helper functions for data conversion
-def convert_height(height_str):
-    """Convert height string to cm"""
-    if isinstance(height_str, str) and "'" in height_str:
-        try:
-            feet, inches = height_str.replace('"', '').split("'")
-            return float(feet) * 30.48 + float(inches.strip()) * 2.54
-        except:
-            return 180.0
-    return 180.0
-
-def convert_reach(reach_str):
-    """Convert reach string to cm"""
-    if isinstance(reach_str, str) and reach_str.replace('"', '').replace('-', '').strip().isdigit():
-        return float(reach_str.replace('"', '')) * 2.54
-    return 180.0
-
-def convert_weight(weight_str):
-    """Convert weight string to lbs"""
-    if isinstance(weight_str, str):
-        try:
-            return float(''.join(filter(str.isdigit, weight_str)))
-        except:
-            return 170.0
-    return 170.0
-
 @st.cache_data(ttl=300)  # Cache for 5 minutes
 def load_live_data():
     """Load fighter data from UFC Stats Crawler"""
@@ -109,50 +86,12 @@ def load_live_data():
     
     try:
         if os.path.exists(crawler_data_path):
-            df = pd.read_csv(crawler_data_path)
-            
-            # Create legacy-compatible dataframe
-            legacy_df = pd.DataFrame()
-            legacy_df['fighter'] = df['name']  # Map to 'fighter' column name
-            
-            # Map stats
-            legacy_df['wins'] = df.get('n_win', 0)
-            legacy_df['losses'] = df.get('n_loss', 0)
-            legacy_df['Height_cms'] = df.apply(lambda row: convert_height(row.get('height', '')), axis=1)
-            legacy_df['Reach_cms'] = df.apply(lambda row: convert_reach(row.get('reach', '')), axis=1)
-            legacy_df['Weight_lbs'] = df.apply(lambda row: convert_weight(row.get('weight', '')), axis=1)
-            
-            # Performance stats
-            legacy_df['sig_str_land_pM'] = df.get('sig_str_land_pM', 0).fillna(0)
-            legacy_df['sig_str_abs_pM'] = df.get('sig_str_abs_pM', 0).fillna(0)
-            legacy_df['sig_str_def_pct'] = df.get('sig_str_def_pct', 0).fillna(0)
-            legacy_df['sig_str_land_pct'] = df.get('sig_str_land_pct', 0).fillna(0)
-            legacy_df['td_avg'] = df.get('td_avg', 0).fillna(0)
-            legacy_df['td_def_pct'] = df.get('td_def_pct', 0).fillna(0)
-            legacy_df['td_land_pct'] = df.get('td_land_pct', 0).fillna(0)
-            legacy_df['sub_avg'] = df.get('sub_avg', 0).fillna(0)
-            
-            # Stance encoding
-            stance_col = df.get('stance', pd.Series(['Orthodox'] * len(df)))
-            legacy_df['Stance_Orthodox'] = (stance_col == 'Orthodox').astype(int)
-            legacy_df['Stance_Southpaw'] = (stance_col == 'Southpaw').astype(int)
-            legacy_df['Stance_Switch'] = (stance_col == 'Switch').astype(int)
-            legacy_df['Stance_Open_Stance'] = (~stance_col.isin(['Orthodox', 'Southpaw', 'Switch'])).astype(int)
-            
-            # Default missing columns
-            default_cols = {
-                'current_lose_streak': 0, 'current_win_streak': 0, 'longest_win_streak': 0,
-                'total_rounds_fought': 0, 'total_title_bouts': 0, 'win_by_Decision_Majority': 0,
-                'win_by_Decision_Split': 0, 'win_by_Decision_Unanimous': 0, 'win_by_KO_TKO': 0,
-                'win_by_Submission': 0, 'win_by_TKO_Doctor_Stoppage': 0, 'age': 30
-            }
-            
-            for col, default_val in default_cols.items():
-                legacy_df[col] = default_val
-            
-            # Fill any remaining NaN values
-            legacy_df = legacy_df.fillna(0)
+            df = read_crawler_table(crawler_data_path, columns=CRAWLER_COLUMNS)
             
+            # Model columns, named as in FIGHTER_STAT.csv ('fighter', 'wins', ...)
+            legacy_df = crawler_features(df)
+            legacy_df.attrs['source'] = crawler_data_path
+
             st.success(f"✅ Loaded {len(legacy_df)} fighters from live UFC Stats Crawler")
             return legacy_df
             
@@ -162,33 +101,46 @@ def load_live_data():
     # Fallback to static CSV
     try:
         fallback_df = pd.read_csv("FIGHTER_STAT_ENHANCED.csv")
+        fallback_df.attrs['source'] = "FIGHTER_STAT_ENHANCED.csv"
         st.info("📁 Using static fighter data as fallback")
         return fallback_df
     except:
         st.error("❌ Could not load any fighter data")
         return pd.DataFrame()
 
+@st.cache_resource(ttl=300)
+def load_feature_store():
+    """Model features of every fighter, built once per data refresh"""
+    return FeatureStore.from_frame(load_live_data())
+
+@st.cache_resource(ttl=300)
+def load_matchup_matrix():
+    """In-division probabilities precomputed for this data and model (matchup_matrix.py), if any"""
+    source = load_live_data().attrs.get('source')
+    return MatchupMatrix.find(source, "ens_method.sav") if source else None
+
 # Load data
 df = load_live_data()
 fighters = df["fighter"].tolist() if not df.empty else []
+store = load_feature_store()
+matchups = load_matchup_matrix()
 ens_method = pickle.load(open("ens_method.sav", 'rb'))
 
 def predictEnsemble(sample):
     prediction = ens_method.predict(sample)
     return (prediction)
 
-def predictMatchByID(B, R):
-    blueFighter = df[df["ID"] == B].iloc[:,3:]
-    blueFighter.columns = ['B_'+col for col in blueFighter.columns] #concat prefix B_ and rename columns
+def predictMatch(blue, red):
+    # In-division matchups are a lookup when the matrix has been built; it
+    # stores predict's own answer, not a rounded probability
+    winner = matchups.winner(blue, red) if matchups is not None else None
+    if winner is not None:
+        return winner
+    return predictEnsemble(store.matchup(blue, red)).tolist()[0]
 
-    redFighter = df[df["ID"] == R].iloc[:,3:]
-    redFighter.columns = ['R_'+col for col in redFighter.columns]
-
-    blueFighter.reset_index(drop=True,inplace=True)
-    redFighter.reset_index(drop=True,inplace=True)
-
-    toPredict = pd.concat([blueFighter,redFighter],axis=1).values
-    return (toPredict)
+def predictMatchByID(B, R):
+    # B_ features of the blue fighter followed by R_ features of the red one
+    return store.matchup_by_id(B, R)
 
 def main():
     r_fighter = st.selectbox("Red Fighter", fighters)
@@ -205,13 +157,8 @@ def main():
                     0:str(r_fighter)
                 }
 
-                b_id = df["ID"][df["fighter"]==b_fighter].values[0]
-                r_id = df["ID"][df["fighter"]==r_fighter].values[0]
-                #print(f"blue id: {b_id}, red id: {r_id}")
-                sample = predictMatchByID(b_id, r_id)
-                #print(sample)
-
-                prediction = predictEnsemble(sample).tolist()[0]
+                # Live crawler data has no ID column, so look fighters up by name
+                prediction = predictMatch(b_fighter, r_fighter)
                 #st.title(prediction)
 
                 st.success(players[prediction] + ' Wins')
@@ -237,20 +184,17 @@ def main():
         for f1, f2, desc in ufc320_fights:
             try:
                 # Check if both fighters exist in dataset
-                if f1 in fighters and f2 in fighters:
-                    b_id = df["ID"][df["fighter"]==f1].values[0]
-                    r_id = df["ID"][df["fighter"]==f2].values[0]
-                    sample = predictMatchByID(b_id, r_id)
-                    prediction = predictEnsemble(sample).tolist()[0]
+                if f1 in store and f2 in store:
+                    prediction = predictMatch(f1, f2)
                     
                     winner = f1 if prediction == 1 else f2
                     st.write(f"**{desc}**: {f1} vs {f2} → **{winner} wins** ✅")
                 else:
                     # Handle fighters not in dataset
                     missing = []
-                    if f1 not in fighters:
+                    if f1 not in store:
                         missing.append(f1)
-                    if f2 not in fighters:
+                    if f2 not in store:
                         missing.append(f2)
                     st.write(f"**{desc}**: {f1} vs {f2} → ⚠️ Missing data for: {', '.join(missing)}")
                     
@@ -2,10 +2,11 @@ import streamlit as st
 import pandas as pd
 import pickle
 import requests
-import numpy as np
 from PIL import Image
 from typing import Dict, Any, Optional
 import os
+from crawler_data import read_crawler_table
+from feature_store import FEATURE_COLUMNS, FeatureStore, crawler_features
 
 # Configure page
 st.set_page_config(
@@ -56,6 +57,9 @@ st.markdown('''
         </style>
         ''',unsafe_allow_html=True)
 
+# fighter name -> (ETag, /fighter response) from the stats API
+_api_etags: Dict[str, tuple] = {}
+
 class UFC_Live_API:
     """Interface to UFC Stats Crawler API for live data"""
     
@@ -66,21 +70,28 @@ class UFC_Live_API:
     def get_fighter_data(self, fighter_name: str) -> Optional[Dict[str, Any]]:
         """Get fighter data from API or fallback to local file"""
         try:
-            # Try API first
+            # Try API first, revalidating any earlier answer by its ETag
+            cached = _api_etags.get(fighter_name)
+            headers = {"If-None-Match": cached[0]} if cached else {}
             response = requests.get(f"{self.api_base_url}/fighter", 
                                   params={"name": fighter_name, "limit": 1},
-                                  timeout=5)
-            if response.status_code == 200:
+                                  headers=headers, timeout=5)
+            data = None
+            if response.status_code == 304 and cached:
+                data = cached[1]
+            elif response.status_code == 200:
                 data = response.json()
-                if data.get("results"):
-                    return data["results"][0]
+                if response.headers.get("ETag"):
+                    _api_etags[fighter_name] = (response.headers["ETag"], data)
+            if data and data.get("results"):
+                return data["results"][0]
         except:
             pass
             
         # Fallback to local crawler data
         try:
             if os.path.exists(self.crawler_data_path):
-                df = pd.read_csv(self.crawler_data_path)
+                df = read_crawler_table(self.crawler_data_path)
                 matches = df[df['name'].str.contains(fighter_name, case=False, na=False)]
                 if not matches.empty:
                     return matches.iloc[0].to_dict()
@@ -93,7 +104,7 @@ class UFC_Live_API:
         """Get list of all available fighters"""
         try:
             if os.path.exists(self.crawler_data_path):
-                df = pd.read_csv(self.crawler_data_path)
+                df = read_crawler_table(self.crawler_data_path, columns=['name'])
                 return sorted(df['name'].dropna().tolist())
         except:
             pass
@@ -101,69 +112,9 @@ class UFC_Live_API:
 
     def convert_to_prediction_format(self, fighter_data: Dict[str, Any]) -> Dict[str, float]:
         """Convert API/crawler data to prediction model format"""
-        converted = {}
-        
-        # Handle height conversion
-        height_str = fighter_data.get('height', '')
-        if isinstance(height_str, str) and "'" in height_str:
-            try:
-                feet, inches = height_str.replace('"', '').split("'")
-                converted['Height_cms'] = float(feet) * 30.48 + float(inches.strip()) * 2.54
-            except:
-                converted['Height_cms'] = 180.0  # Default
-        else:
-            converted['Height_cms'] = 180.0
-            
-        # Handle reach conversion
-        reach_str = fighter_data.get('reach', '')
-        if isinstance(reach_str, str) and reach_str.replace('"', '').replace('-', '').strip().isdigit():
-            converted['Reach_cms'] = float(reach_str.replace('"', '')) * 2.54
-        else:
-            converted['Reach_cms'] = converted['Height_cms'] * 1.1  # Estimate
-            
-        # Handle weight conversion
-        weight_str = fighter_data.get('weight', '')
-        if isinstance(weight_str, str):
-            try:
-                converted['Weight_lbs'] = float(''.join(filter(str.isdigit, weight_str)))
-            except:
-                converted['Weight_lbs'] = 170.0  # Default
-        else:
-            converted['Weight_lbs'] = 170.0
-
-        # Fight record
-        converted['wins'] = float(fighter_data.get('n_win', 0))
-        converted['losses'] = float(fighter_data.get('n_loss', 0))
-        
-        # Performance stats
-        converted['sig_str_land_pM'] = float(fighter_data.get('sig_str_land_pM', 0))
-        converted['sig_str_abs_pM'] = float(fighter_data.get('sig_str_abs_pM', 0))
-        converted['sig_str_def_pct'] = float(fighter_data.get('sig_str_def_pct', 0))
-        converted['sig_str_land_pct'] = float(fighter_data.get('sig_str_land_pct', 0))
-        converted['td_avg'] = float(fighter_data.get('td_avg', 0))
-        converted['td_def_pct'] = float(fighter_data.get('td_def_pct', 0))
-        converted['td_land_pct'] = float(fighter_data.get('td_land_pct', 0))
-        converted['sub_avg'] = float(fighter_data.get('sub_avg', 0))
-
-        # Stance encoding
-        stance = fighter_data.get('stance', 'Orthodox')
-        converted['Stance_Orthodox'] = 1.0 if stance == 'Orthodox' else 0.0
-        converted['Stance_Southpaw'] = 1.0 if stance == 'Southpaw' else 0.0
-        converted['Stance_Switch'] = 1.0 if stance == 'Switch' else 0.0
-        converted['Stance_Open_Stance'] = 1.0 if stance not in ['Orthodox', 'Southpaw', 'Switch'] else 0.0
-
-        # Default values for missing fields
-        defaults = {
-            'current_lose_streak': 0, 'current_win_streak': 0, 'longest_win_streak': 0,
-            'total_rounds_fought': 0, 'total_title_bouts': 0, 'win_by_Decision_Majority': 0,
-            'win_by_Decision_Split': 0, 'win_by_Decision_Unanimous': 0, 'win_by_KO_TKO': 0,
-            'win_by_Submission': 0, 'win_by_TKO_Doctor_Stoppage': 0, 'age': 30
-        }
-        
-        for key, default_val in defaults.items():
-            converted[key] = float(fighter_data.get(key, default_val))
-
-        return converted
+        features = crawler_features(pd.DataFrame([fighter_data]), estimate_reach=True)
+        # The model's columns only, in training order
+        return {column: float(features[column].iloc[0]) for column in FEATURE_COLUMNS}
 
 @st.cache_data(ttl=300)  # Cache for 5 minutes
 def load_model():
@@ -197,17 +148,10 @@ def predict_fight(fighter1_name: str, fighter2_name: str, model) -> Dict[str, An
         return {"error": "Fighter data not found"}
     
     try:
-        # Convert to prediction format
-        f1_features = api.convert_to_prediction_format(f1_data)
-        f2_features = api.convert_to_prediction_format(f2_data)
-        
-        # Create feature vectors (Blue vs Red format)
-        blue_features = {f'B_{k}': v for k, v in f1_features.items()}
-        red_features = {f'R_{k}': v for k, v in f2_features.items()}
-        
-        # Combine features
-        all_features = {**blue_features, **red_features}
-        feature_vector = np.array([list(all_features.values())])
+        # Convert both fighters in one pass; Blue's features, then Red's,
+        # each in the FEATURE_COLUMNS order the model was trained on
+        features = crawler_features(pd.DataFrame([f1_data, f2_data]), estimate_reach=True)
+        feature_vector = FeatureStore.from_frame(features).gather([0], [1])
         
         # Make prediction
         prediction = model.predict(feature_vector)[0]
@@ -0,0 +1,66 @@
+# Load time of app.py's live fighter table on a full crawler snapshot: the
+# row-wise conversion load_live_data used to run (kept as the parity
+# reference in test_feature_conversion.py) against
+# feature_store.crawler_features.
+#
+#     python benchmarks/bench_conversion.py [path/to/fighter_stats/latest.csv]
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from crawler_data import read_crawler_table  # noqa: E402
+from feature_store import crawler_features  # noqa: E402
+from test_feature_conversion import (legacy_convert_to_prediction_format,  # noqa: E402
+                                     legacy_load_live_data)
+
+NUMERIC_COLUMNS = ['height_cm', 'reach_cm', 'weight_lbs', 'stance_orthodox',
+                   'stance_southpaw', 'stance_switch', 'stance_open_stance']
+
+
+def timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the crawler-to-model conversions before and after vectorizing')
+    parser.add_argument("csv", nargs="?", default=os.path.join(
+        "..", "..", "ufc-stats-crawler", "data", "fighter_stats", "latest.csv"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    read_ms = timed(lambda: read_crawler_table(args.csv), args.repeat)
+    # The old app.py conversion had no age; leave it out on both sides
+    df = read_crawler_table(args.csv).drop(columns=['age'], errors='ignore')
+    # Snapshots from before the crawler wrote numeric columns: the slow path
+    text_only = df.drop(columns=[c for c in NUMERIC_COLUMNS if c in df.columns])
+    records = text_only.to_dict(orient="records")
+    print(f"{args.csv}: {len(df)} fighters, read {read_ms:.1f} ms")
+
+    cases = [
+        ("app.py, text columns", lambda: legacy_load_live_data(text_only),
+         lambda: crawler_features(text_only)),
+        ("app.py, numeric columns", lambda: legacy_load_live_data(df),
+         lambda: crawler_features(df)),
+        ("app_live.py, every fighter",
+         lambda: [legacy_convert_to_prediction_format(r) for r in records],
+         lambda: crawler_features(text_only, estimate_reach=True)),
+    ]
+    print(f"{'conversion':<30}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name, before, after in cases:
+        old = timed(before, args.repeat)
+        new = timed(after, args.repeat)
+        print(f"{name:<30}{old:>12.1f}{new:>12.1f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import pandas as pd
+
+
+def crawler_table_path(csv_path):
+    """The file read_crawler_table loads for `csv_path`.
+
+    The .arrow copy next to the CSV, if pyarrow is installed and that copy
+    is at least as new as the CSV; a later crawl that wrote only the CSV
+    makes the Arrow file stale.
+    """
+    arrow_path = os.path.splitext(csv_path)[0] + '.arrow'
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return csv_path
+    if os.path.exists(arrow_path) and (not os.path.exists(csv_path)
+                                       or os.path.getmtime(arrow_path) >= os.path.getmtime(csv_path)):
+        return arrow_path
+    return csv_path
+
+
+def read_crawler_table(csv_path, columns=None):
+    """Load a crawler snapshot, preferring the columnar copy next to the CSV.
+
+    The crawler writes data/<table>/latest.arrow alongside latest.csv. That
+    file is memory-mapped and only `columns` are read from it; without it
+    (or without pyarrow, or when the CSV is newer) the CSV is parsed,
+    restricted to `columns`.
+    """
+    path = crawler_table_path(csv_path)
+    if path != csv_path:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        if columns is not None:
+            with pa.memory_map(path) as source:
+                names = pa.ipc.open_file(source).schema.names
+            columns = [c for c in columns if c in names]
+        return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+    if columns is None:
+        return pd.read_csv(csv_path)
+    wanted = set(columns)
+    return pd.read_csv(csv_path, usecols=lambda c: c in wanted)
@@ -0,0 +1,216 @@
+import numpy as np
+import pandas as pd
+
+# Per-fighter model inputs, in the order the ensemble was trained on
+# (UFC_TRAIN.csv holds B_<column> for each of these, then R_<column>)
+FEATURE_COLUMNS = [
+    'current_lose_streak', 'current_win_streak', 'longest_win_streak', 'losses',
+    'total_rounds_fought', 'total_title_bouts', 'win_by_Decision_Majority',
+    'win_by_Decision_Split', 'win_by_Decision_Unanimous', 'win_by_KO_TKO',
+    'win_by_Submission', 'win_by_TKO_Doctor_Stoppage', 'wins', 'Height_cms',
+    'Reach_cms', 'Weight_lbs', 'age', 'Stance_Open_Stance', 'Stance_Orthodox',
+    'Stance_Southpaw', 'Stance_Switch'
+]
+
+
+class FeatureStore:
+    """Fighter features as one contiguous float32 matrix, one row per fighter.
+
+    Rows are found through name -> row and ID -> row dicts, and a matchup
+    is the blue fighter's row followed by the red fighter's, gathered
+    straight from the matrix, so predicting does not touch pandas.
+    """
+
+    def __init__(self, names, matrix, ids=None, columns=FEATURE_COLUMNS):
+        self.columns = list(columns)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.names = list(names)
+        # The first row wins for repeated names / IDs, like .values[0] did
+        self.row_by_name = {}
+        for row, name in enumerate(self.names):
+            self.row_by_name.setdefault(name, row)
+        self.row_by_id = {}
+        if ids is not None:
+            for row, fighter_id in enumerate(ids):
+                self.row_by_id.setdefault(fighter_id, row)
+
+    @classmethod
+    def from_frame(cls, df, name_column='fighter', id_column='ID', columns=FEATURE_COLUMNS):
+        """Build from a frame holding the model columns (missing ones are 0)."""
+        values = (df.reindex(columns=list(columns), fill_value=0)
+                    .apply(pd.to_numeric, errors='coerce')
+                    .fillna(0)
+                    .to_numpy(dtype=np.float32))
+        ids = df[id_column].tolist() if id_column in df.columns else None
+        names = df[name_column].tolist() if name_column in df.columns else []
+        return cls(names, values, ids=ids, columns=columns)
+
+    @classmethod
+    def from_csv(cls, csv_path, columns=FEATURE_COLUMNS):
+        """Build from FIGHTER_STAT.csv or FIGHTER_STAT_ENHANCED.csv."""
+        wanted = {'ID', 'fighter', *columns}
+        df = pd.read_csv(csv_path, usecols=lambda c: c in wanted)
+        return cls.from_frame(df, columns=columns)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.row_by_name
+
+    @property
+    def feature_names(self):
+        return ['B_' + c for c in self.columns] + ['R_' + c for c in self.columns]
+
+    def row(self, name):
+        try:
+            return self.row_by_name[name]
+        except KeyError:
+            raise ValueError(f"Fighter '{name}' not found in database") from None
+
+    def row_of_id(self, fighter_id):
+        try:
+            return self.row_by_id[fighter_id]
+        except KeyError:
+            raise ValueError(f"Fighter ID '{fighter_id}' not found in database") from None
+
+    def gather(self, blue_rows, red_rows):
+        """Matchup vectors, shape (pairs, 2 * features), for paired row numbers."""
+        blue_rows = np.asarray(blue_rows, dtype=np.intp)
+        red_rows = np.asarray(red_rows, dtype=np.intp)
+        n = len(self.columns)
+        out = np.empty((len(blue_rows), 2 * n), dtype=np.float32)
+        out[:, :n] = self.matrix[blue_rows]
+        out[:, n:] = self.matrix[red_rows]
+        return out
+
+    def matchup(self, blue, red):
+        """Model input (1, 2 * features) for blue vs red, by fighter name."""
+        return self.gather([self.row(blue)], [self.row(red)])
+
+    def matchup_by_id(self, blue_id, red_id):
+        return self.gather([self.row_of_id(blue_id)], [self.row_of_id(red_id)])
+
+    def matchups(self, pairs):
+        """Model input for many (blue, red) name pairs at once."""
+        rows = np.array([(self.row(b), self.row(r)) for b, r in pairs], dtype=np.intp).reshape(-1, 2)
+        return self.gather(rows[:, 0], rows[:, 1])
+
+
+# Crawler columns crawler_features reads
+CRAWLER_COLUMNS = [
+    'name', 'n_win', 'n_loss', 'height', 'reach', 'weight', 'stance',
+    'sig_str_land_pM', 'sig_str_abs_pM', 'sig_str_def_pct', 'sig_str_land_pct',
+    'td_avg', 'td_def_pct', 'td_land_pct', 'sub_avg',
+    # Numeric columns written by newer crawls (FighterNumbersPipeline),
+    # including the age on the crawl date
+    'height_cm', 'reach_cm', 'weight_lbs', 'age', 'stance_orthodox',
+    'stance_southpaw', 'stance_switch', 'stance_open_stance'
+]
+
+# Crawler performance stats carried over as they are
+CRAWLER_STATS = [
+    'sig_str_land_pM', 'sig_str_abs_pM', 'sig_str_def_pct', 'sig_str_land_pct',
+    'td_avg', 'td_def_pct', 'td_land_pct', 'sub_avg'
+]
+
+# Model columns the crawler has no source for, with their defaults. Age is
+# read from newer crawls and is 30 for older ones or an unknown birth date
+DEFAULT_FEATURES = {
+    'current_lose_streak': 0, 'current_win_streak': 0, 'longest_win_streak': 0,
+    'total_rounds_fought': 0, 'total_title_bouts': 0, 'win_by_Decision_Majority': 0,
+    'win_by_Decision_Split': 0, 'win_by_Decision_Unanimous': 0, 'win_by_KO_TKO': 0,
+    'win_by_Submission': 0, 'win_by_TKO_Doctor_Stoppage': 0, 'age': 30
+}
+
+# 5' 11"  (after dropping the inch marks)
+HEIGHT_PATTERN = r"^\s*(\d+(?:\.\d+)?)\s*'\s*(\d+(?:\.\d+)?)\s*$"
+
+
+def _text(df, column):
+    if column in df.columns:
+        return df[column]
+    return pd.Series(np.nan, index=df.index, dtype=object)
+
+
+def _per_value(values, parse):
+    """Apply `parse` (str ops on a Series) to the distinct values only.
+
+    A crawler text column holds a few dozen distinct heights or weights
+    across thousands of fighters; the parsed values are spread back over
+    the rows with a NumPy gather (NaN rows stay NaN).
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype=object)
+    # Numbers and other non-strings get the default, as they always have
+    uniques = uniques.where(uniques.map(type) == str)
+    parsed = pd.to_numeric(parse(uniques), errors='coerce').to_numpy(dtype=float)
+    return pd.Series(np.append(parsed, np.nan)[codes], index=values.index)
+
+
+def _height_cm(text):
+    feet_inches = text.str.replace('"', '', regex=False).str.extract(HEIGHT_PATTERN)
+    return pd.to_numeric(feet_inches[0]) * 30.48 + pd.to_numeric(feet_inches[1]) * 2.54
+
+
+def _reach_cm(text):
+    inches = text.str.replace('"', '', regex=False).str.extract(r'^\s*(\d+)\s*$')[0]
+    return pd.to_numeric(inches) * 2.54
+
+
+def _weight_lbs(text):
+    # Every digit of e.g. "155 lbs."
+    return text.str.replace(r'\D', '', regex=True)
+
+
+def _number(df, column, default):
+    if column not in df.columns:
+        return pd.Series(default, index=df.index, dtype=float)
+    return pd.to_numeric(df[column], errors='coerce').fillna(default)
+
+
+def crawler_features(df, estimate_reach=False):
+    """Model features for a crawler fighter_stats frame, one row per fighter.
+
+    Uses the numeric height_cm / reach_cm / weight_lbs and stance_* columns
+    of newer crawls, and otherwise parses the text columns (5' 11", 72",
+    155 lbs.). Values that are missing or do not parse get the defaults the
+    apps have always used: 180 cm height and reach (height * 1.1 for reach
+    with `estimate_reach`), 170 lbs, age 30 and 0 for everything else.
+    The crawled age is used when the frame has it.
+    """
+    # Collected first and turned into a frame once; inserting column by
+    # column costs more than the conversion itself
+    out = {'fighter': df['name'] if 'name' in df.columns else np.nan}
+
+    if 'height_cm' in df.columns:
+        # Already parsed at crawl time
+        height = _number(df, 'height_cm', np.nan)
+        reach = _number(df, 'reach_cm', np.nan)
+        weight = _number(df, 'weight_lbs', np.nan)
+    else:
+        height = _per_value(_text(df, 'height'), _height_cm)
+        reach = _per_value(_text(df, 'reach'), _reach_cm)
+        weight = _per_value(_text(df, 'weight'), _weight_lbs)
+    out['Height_cms'] = height.fillna(180.0)
+    out['Reach_cms'] = reach.fillna(out['Height_cms'] * 1.1 if estimate_reach else 180.0)
+    out['Weight_lbs'] = weight.fillna(170.0)
+
+    out['wins'] = _number(df, 'n_win', 0)
+    out['losses'] = _number(df, 'n_loss', 0)
+    for column in CRAWLER_STATS:
+        out[column] = _number(df, column, 0)
+
+    if 'stance_orthodox' in df.columns:
+        for stance in ('orthodox', 'southpaw', 'switch', 'open_stance'):
+            out[f'Stance_{stance.title()}'] = _number(df, f'stance_{stance}', 0).astype(int)
+    else:
+        stance = df['stance'] if 'stance' in df.columns else pd.Series('Orthodox', index=df.index)
+        out['Stance_Orthodox'] = (stance == 'Orthodox').astype(int)
+        out['Stance_Southpaw'] = (stance == 'Southpaw').astype(int)
+        out['Stance_Switch'] = (stance == 'Switch').astype(int)
+        out['Stance_Open_Stance'] = (~stance.isin(['Orthodox', 'Southpaw', 'Switch'])).astype(int)
+
+    for column, default in DEFAULT_FEATURES.items():
+        out[column] = _number(df, column, default)
+    return pd.DataFrame(out, index=df.index)
@@ -0,0 +1,299 @@
+"""Win probabilities for every matchup inside each weight class, precomputed.
+
+    python matchup_matrix.py --fighters FIGHTER_STAT_ENHANCED.csv --model ens_method.sav
+    python matchup_matrix.py --fighters <crawler>/data/fighter_stats/latest.csv \
+        --fights <crawler>/data/fight_info/latest.csv --active-since 2023-01-01
+
+runs the ensemble's predict_proba over every ordered (blue, red) pair of
+fighters in the same division, in large batches spread over a process pool,
+and stores P(blue wins) and the predicted winner as .npy matrices per
+division under matchups/<snapshot version>-<model version>-v<FORMAT>/. The
+apps open those matrices memory-mapped (MatchupMatrix) and answer in-division
+matchups by lookup; a new snapshot or model gets a new directory, so a stale
+matrix is never used.
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from crawler_data import crawler_table_path, read_crawler_table
+from feature_store import CRAWLER_COLUMNS, FeatureStore, crawler_features
+
+MATCHUP_DIR = 'matchups'
+INDEX = 'index.json'
+# Bump when build() computes something different for the same inputs
+FORMAT = 2
+
+# Weight limit (lbs) of each division
+DIVISIONS = [
+    (115, 'Strawweight'), (125, 'Flyweight'), (135, 'Bantamweight'),
+    (145, 'Featherweight'), (155, 'Lightweight'), (170, 'Welterweight'),
+    (185, 'Middleweight'), (205, 'Light Heavyweight'), (265, 'Heavyweight')
+]
+
+
+def file_version(path):
+    """Short content hash; any change to the file gives a new version."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def matrix_dir(fighters_path, model_path, root=MATCHUP_DIR):
+    # Versioned by the file that is actually loaded (latest.arrow or the CSV)
+    fighters = file_version(crawler_table_path(fighters_path))
+    return os.path.join(root, f'{fighters}-{file_version(model_path)}-v{FORMAT}')
+
+
+def division_of_weight(weights):
+    """Division names for weights in lbs (None where unknown)."""
+    weights = np.asarray(weights, dtype=float)
+    limits = np.array([limit for limit, _ in DIVISIONS], dtype=float)
+    # The lightest division whose limit the weight is within; heavier
+    # than the heavyweight limit still counts as heavyweight
+    idx = np.minimum(np.searchsorted(limits, weights, side='left'), len(DIVISIONS) - 1)
+    names = np.array([name for _, name in DIVISIONS], dtype=object)[idx]
+    names[~(weights > 0)] = None
+    return names
+
+
+def division_of_bout(weight_class):
+    """'UFC Women's Flyweight Title Bout' -> "Women's Flyweight"; None for catch weights."""
+    if not isinstance(weight_class, str):
+        return None
+    # Longest name first, so Light Heavyweight is not read as Heavyweight
+    for _, name in sorted(DIVISIONS, key=lambda d: -len(d[1])):
+        if name.lower() in weight_class.lower():
+            return f"Women's {name}" if re.search(r"women", weight_class, re.I) else name
+    return None
+
+
+def last_bouts(fights):
+    """Per fighter_id: date and division of the latest fight (from fight_info)."""
+    both = pd.concat([
+        fights[['fighter_1_id', 'date', 'weight_class']].rename(columns={'fighter_1_id': 'fighter_id'}),
+        fights[['fighter_2_id', 'date', 'weight_class']].rename(columns={'fighter_2_id': 'fighter_id'}),
+    ])
+    both['date'] = pd.to_datetime(both['date'], errors='coerce', format='mixed')
+    both['division'] = both['weight_class'].map(division_of_bout)
+    both = both.sort_values('date')
+    last = both.groupby('fighter_id').agg(last_fight=('date', 'last'))
+    # Catch weight bouts say nothing about the division
+    last['division'] = both.dropna(subset=['division']).groupby('fighter_id')['division'].last()
+    return last
+
+
+def load_fighters(fighters_path, fights_path=None):
+    """FeatureStore of every fighter, plus each fighter's division and last fight date.
+
+    Features are built exactly like the apps build them, so a looked-up
+    probability is the one the ensemble gives on a click.
+    """
+    if 'name' in pd.read_csv(fighters_path, nrows=0).columns:
+        # Crawler snapshot, converted as app.py's load_live_data does
+        df = read_crawler_table(fighters_path, columns=CRAWLER_COLUMNS + ['fighter_id'])
+        store = FeatureStore.from_frame(crawler_features(df))
+        fighter_ids = df['fighter_id'] if 'fighter_id' in df.columns else pd.Series(np.nan, index=df.index)
+        last_fight = pd.Series(pd.NaT, index=df.index)
+    else:
+        # FIGHTER_STAT.csv: `date` is the fighter's last fight
+        df = pd.read_csv(fighters_path)
+        store = FeatureStore.from_frame(df)
+        fighter_ids = pd.Series(np.nan, index=df.index)
+        last_fight = pd.to_datetime(df.get('date'), errors='coerce')
+
+    weight = store.matrix[:, store.columns.index('Weight_lbs')]
+    division = pd.Series(division_of_weight(weight), index=df.index)
+    if fights_path is not None:
+        if fighter_ids.isna().all():
+            # Nothing to join on: every fighter would lose their last fight date
+            raise ValueError('--fights needs a crawler fighter_stats snapshot (with fighter_id)')
+        last = last_bouts(pd.read_csv(fights_path)).reindex(fighter_ids.values)
+        last.index = df.index
+        division = last['division'].fillna(division)
+        last_fight = last['last_fight']
+    return store, division, last_fight
+
+
+# Worker state, set once per process by _init_worker
+_model = None
+_store = None
+_blue_column = None
+_blue_wins = None
+
+
+def _init_worker(model_path, store):
+    global _model, _store, _blue_column, _blue_wins
+    with open(model_path, 'rb') as f:
+        _model = pickle.load(f)
+    _store = store
+    # Label 1 = blue wins
+    _blue_column = list(_model.classes_).index(1)
+    _blue_wins = np.asarray(_model.classes_) == 1
+
+
+def _predict_block(division, rows, start, stop):
+    """P(blue wins) and the predicted winner (1 = blue, like predict) for blue
+    fighters rows[start:stop] against all of `rows`."""
+    blue = np.repeat(rows[start:stop], len(rows))
+    red = np.tile(rows, stop - start)
+    proba = _model.predict_proba(_store.gather(blue, red))
+    # predict's class, taken before the probabilities are rounded to the
+    # matrix dtype (0.5001 is 0.5 in float16)
+    winner = _blue_wins[proba.argmax(axis=1)].astype(np.int8)
+    shape = (stop - start, len(rows))
+    return (division, start, proba[:, _blue_column].reshape(shape).astype(np.float32),
+            winner.reshape(shape))
+
+
+def build(fighters_path, model_path, fights_path=None, root=MATCHUP_DIR, active_since=None,
+          dtype='float32', workers=None, chunk_pairs=20000):
+    """Compute and publish the matrices; returns their directory."""
+    target = matrix_dir(fighters_path, model_path, root)
+    store, division, last_fight = load_fighters(fighters_path, fights_path)
+
+    keep = division.notna()
+    if active_since is not None:
+        keep &= last_fight >= pd.Timestamp(active_since)
+    # One row per name, as the apps look fighters up by name
+    keep &= ~pd.Series(store.names, index=division.index).duplicated()
+    keep = keep.to_numpy()
+    divisions = division.to_numpy()
+
+    groups = {}
+    for name in sorted(set(divisions[keep])):
+        rows = np.flatnonzero(keep & (divisions == name))
+        if len(rows) > 1:
+            groups[name] = rows
+
+    tmp = f'{target}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    matrices = {}
+    winners = {}
+    index = {'fighters': os.path.basename(fighters_path), 'snapshot': file_version(crawler_table_path(fighters_path)),
+             'model': file_version(model_path), 'dtype': dtype, 'divisions': {}}
+    for name, rows in groups.items():
+        file = re.sub(r'\W+', '_', name.lower()).strip('_') + '.npy'
+        matrices[name] = np.lib.format.open_memmap(os.path.join(tmp, file), mode='w+',
+                                                   dtype=dtype, shape=(len(rows), len(rows)))
+        winner_file = file.replace('.npy', '_winner.npy')
+        winners[name] = np.lib.format.open_memmap(os.path.join(tmp, winner_file), mode='w+',
+                                                  dtype=np.int8, shape=(len(rows), len(rows)))
+        index['divisions'][name] = {'file': file, 'winner_file': winner_file,
+                                    'fighters': [store.names[r] for r in rows]}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path, store)) as pool:
+        jobs = []
+        for name, rows in groups.items():
+            step = max(1, chunk_pairs // len(rows))
+            for start in range(0, len(rows), step):
+                jobs.append(pool.submit(_predict_block, name, rows, start, min(start + step, len(rows))))
+        for job in jobs:
+            name, start, proba, winner = job.result()
+            matrices[name][start:start + len(proba)] = proba
+            winners[name][start:start + len(winner)] = winner
+
+    for name, matrix in matrices.items():
+        # A fighter against themself is not a matchup
+        np.fill_diagonal(matrix, np.nan)
+        np.fill_diagonal(winners[name], -1)
+        matrix.flush()
+        winners[name].flush()
+    del matrices, winners
+    with open(os.path.join(tmp, INDEX), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    # Readers see the whole set or none of it
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    return target
+
+
+class MatchupMatrix:
+    """Lookups into the matrices written by build(), memory-mapped on first use"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX), encoding='utf-8') as f:
+            self.index = json.load(f)
+        self.position = {}
+        for division, entry in self.index['divisions'].items():
+            for i, name in enumerate(entry['fighters']):
+                self.position[name] = (division, i)
+        self._matrices = {}
+
+    @classmethod
+    def find(cls, fighters_path, model_path, root=MATCHUP_DIR):
+        """The matrix for this snapshot and model, or None if it was not built."""
+        try:
+            return cls(matrix_dir(fighters_path, model_path, root))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _matrix(self, division, key='file'):
+        if (division, key) not in self._matrices:
+            path = os.path.join(self.directory, self.index['divisions'][division][key])
+            self._matrices[division, key] = np.load(path, mmap_mode='r')
+        return self._matrices[division, key]
+
+    def _cell(self, blue, red):
+        b = self.position.get(blue)
+        r = self.position.get(red)
+        if b is None or r is None or b[0] != r[0] or blue == red:
+            return None
+        return b[0], b[1], r[1]
+
+    def probability(self, blue, red):
+        """P(blue wins), or None if the two are not in one division's matrix."""
+        cell = self._cell(blue, red)
+        if cell is None:
+            return None
+        division, b, r = cell
+        return float(self._matrix(division)[b, r])
+
+    def winner(self, blue, red):
+        """predict's answer (1 = blue wins, 0 = red), or None if not in the matrices."""
+        cell = self._cell(blue, red)
+        if cell is None:
+            return None
+        division, b, r = cell
+        return int(self._matrix(division, 'winner_file')[b, r])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute in-division matchup probabilities')
+    parser.add_argument('--fighters', default='FIGHTER_STAT_ENHANCED.csv',
+                        help='FIGHTER_STAT*.csv or a crawler fighter_stats snapshot')
+    parser.add_argument('--fights', help="crawler fight_info snapshot: divisions and activity from each fighter's last bout")
+    parser.add_argument('--model', default='ens_method.sav')
+    parser.add_argument('--out', default=MATCHUP_DIR)
+    parser.add_argument('--active-since', help='only fighters with a bout on or after this date (crawler snapshots need --fights)')
+    parser.add_argument('--dtype', choices=['float32', 'float16'], default='float32',
+                        help='probability matrices; winners are stored exactly either way')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-pairs', type=int, default=20000,
+                        help='matchups per predict_proba call')
+    args = parser.parse_args()
+
+    target = build(args.fighters, args.model, args.fights, args.out, args.active_since,
+                   args.dtype, args.workers, args.chunk_pairs)
+    matrix = MatchupMatrix(target)
+    for division, entry in matrix.index['divisions'].items():
+        n = len(entry['fighters'])
+        print(f"{division}: {n} fighters, {n * (n - 1)} matchups")
+    print(f"Written to {target}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+import os
+import numpy as np
+import pandas as pd
+from feature_store import crawler_features
+
+# Parity of feature_store.crawler_features with the per-fighter conversions
+# it replaced in app.py (load_live_data) and app_live.py
+# (UFC_Live_API.convert_to_prediction_format). The old code is kept below
+# as the reference.
+
+CRAWLER_PATH = r"c:\Users\18438\UFC all code\ufc-stats-crawler\data\fighter_stats\latest.csv"
+
+STATS = ['sig_str_land_pM', 'sig_str_abs_pM', 'sig_str_def_pct', 'sig_str_land_pct',
+         'td_avg', 'td_def_pct', 'td_land_pct', 'sub_avg']
+
+
+# --- app.py before vectorizing ---
+
+def convert_height(height_str):
+    """Convert height string to cm"""
+    if isinstance(height_str, str) and "'" in height_str:
+        try:
+            feet, inches = height_str.replace('"', '').split("'")
+            return float(feet) * 30.48 + float(inches.strip()) * 2.54
+        except:
+            return 180.0
+    return 180.0
+
+def convert_reach(reach_str):
+    """Convert reach string to cm"""
+    if isinstance(reach_str, str) and reach_str.replace('"', '').replace('-', '').strip().isdigit():
+        return float(reach_str.replace('"', '')) * 2.54
+    return 180.0
+
+def convert_weight(weight_str):
+    """Convert weight string to lbs"""
+    if isinstance(weight_str, str):
+        try:
+            return float(''.join(filter(str.isdigit, weight_str)))
+        except:
+            return 170.0
+    return 170.0
+
+def legacy_load_live_data(df):
+    legacy_df = pd.DataFrame()
+    legacy_df['fighter'] = df['name']
+    legacy_df['wins'] = df.get('n_win', 0)
+    legacy_df['losses'] = df.get('n_loss', 0)
+    if 'height_cm' in df.columns:
+        legacy_df['Height_cms'] = df['height_cm'].fillna(180.0)
+        legacy_df['Reach_cms'] = df['reach_cm'].fillna(180.0)
+        legacy_df['Weight_lbs'] = df['weight_lbs'].fillna(170.0)
+    else:
+        legacy_df['Height_cms'] = df.apply(lambda row: convert_height(row.get('height', '')), axis=1)
+        legacy_df['Reach_cms'] = df.apply(lambda row: convert_reach(row.get('reach', '')), axis=1)
+        legacy_df['Weight_lbs'] = df.apply(lambda row: convert_weight(row.get('weight', '')), axis=1)
+    for col in STATS:
+        legacy_df[col] = df.get(col, 0).fillna(0)
+    if 'stance_orthodox' in df.columns:
+        legacy_df['Stance_Orthodox'] = df['stance_orthodox'].astype(int)
+        legacy_df['Stance_Southpaw'] = df['stance_southpaw'].astype(int)
+        legacy_df['Stance_Switch'] = df['stance_switch'].astype(int)
+        legacy_df['Stance_Open_Stance'] = df['stance_open_stance'].astype(int)
+    else:
+        stance_col = df.get('stance', pd.Series(['Orthodox'] * len(df)))
+        legacy_df['Stance_Orthodox'] = (stance_col == 'Orthodox').astype(int)
+        legacy_df['Stance_Southpaw'] = (stance_col == 'Southpaw').astype(int)
+        legacy_df['Stance_Switch'] = (stance_col == 'Switch').astype(int)
+        legacy_df['Stance_Open_Stance'] = (~stance_col.isin(['Orthodox', 'Southpaw', 'Switch'])).astype(int)
+    default_cols = {
+        'current_lose_streak': 0, 'current_win_streak': 0, 'longest_win_streak': 0,
+        'total_rounds_fought': 0, 'total_title_bouts': 0, 'win_by_Decision_Majority': 0,
+        'win_by_Decision_Split': 0, 'win_by_Decision_Unanimous': 0, 'win_by_KO_TKO': 0,
+        'win_by_Submission': 0, 'win_by_TKO_Doctor_Stoppage': 0, 'age': 30
+    }
+    for col, default_val in default_cols.items():
+        legacy_df[col] = default_val
+    return legacy_df.fillna(0)
+
+
+# --- app_live.py before vectorizing ---
+
+def legacy_convert_to_prediction_format(fighter_data):
+    converted = {}
+    height_str = fighter_data.get('height', '')
+    if isinstance(height_str, str) and "'" in height_str:
+        try:
+            feet, inches = height_str.replace('"', '').split("'")
+            converted['Height_cms'] = float(feet) * 30.48 + float(inches.strip()) * 2.54
+        except:
+            converted['Height_cms'] = 180.0
+    else:
+        converted['Height_cms'] = 180.0
+    reach_str = fighter_data.get('reach', '')
+    if isinstance(reach_str, str) and reach_str.replace('"', '').replace('-', '').strip().isdigit():
+        converted['Reach_cms'] = float(reach_str.replace('"', '')) * 2.54
+    else:
+        converted['Reach_cms'] = converted['Height_cms'] * 1.1
+    weight_str = fighter_data.get('weight', '')
+    if isinstance(weight_str, str):
+        try:
+            converted['Weight_lbs'] = float(''.join(filter(str.isdigit, weight_str)))
+        except:
+            converted['Weight_lbs'] = 170.0
+    else:
+        converted['Weight_lbs'] = 170.0
+    converted['wins'] = float(fighter_data.get('n_win', 0))
+    converted['losses'] = float(fighter_data.get('n_loss', 0))
+    for col in STATS:
+        converted[col] = float(fighter_data.get(col, 0))
+    stance = fighter_data.get('stance', 'Orthodox')
+    converted['Stance_Orthodox'] = 1.0 if stance == 'Orthodox' else 0.0
+    converted['Stance_Southpaw'] = 1.0 if stance == 'Southpaw' else 0.0
+    converted['Stance_Switch'] = 1.0 if stance == 'Switch' else 0.0
+    converted['Stance_Open_Stance'] = 1.0 if stance not in ['Orthodox', 'Southpaw', 'Switch'] else 0.0
+    defaults = {
+        'current_lose_streak': 0, 'current_win_streak': 0, 'longest_win_streak': 0,
+        'total_rounds_fought': 0, 'total_title_bouts': 0, 'win_by_Decision_Majority': 0,
+        'win_by_Decision_Split': 0, 'win_by_Decision_Unanimous': 0, 'win_by_KO_TKO': 0,
+        'win_by_Submission': 0, 'win_by_TKO_Doctor_Stoppage': 0, 'age': 30
+    }
+    for key, default_val in defaults.items():
+        converted[key] = float(fighter_data.get(key, default_val))
+    return converted
+
+
+def sample_fighters():
+    """Crawler rows covering the formats and gaps seen on ufcstats.com"""
+    df = pd.DataFrame({
+        'name': ['Alex Pereira', 'Merab Dvalishvili', 'No Data', 'Odd Format', 'Numbers', 'Open'],
+        'height': ['6\' 4"', '5\' 6"', '--', '5\'11"', 72.0, None],
+        'reach': ['79"', '68"', '--', '70.5"', 70.0, ' 74" '],
+        'weight': ['205 lbs.', '135 lbs.', '--', '155lbs', 155.0, None],
+        'stance': ['Orthodox', 'Orthodox', None, 'Southpaw', 'Switch', 'Open Stance'],
+        'n_win': [12, 18, 0, 3, 7, 1],
+        'n_loss': [3, 4, 0, 1, 2, 0],
+    })
+    for i, col in enumerate(STATS):
+        df[col] = np.linspace(0, 1, len(df)) + i
+    return df
+
+
+def assert_frames_match(expected, actual):
+    for col in expected.columns:
+        if col == 'fighter':
+            assert expected[col].tolist() == actual[col].tolist()
+        else:
+            np.testing.assert_allclose(actual[col].to_numpy(dtype=float),
+                                       expected[col].to_numpy(dtype=float), err_msg=col)
+
+
+def test_app_text_columns():
+    """Older snapshots: height / reach / weight parsed from text"""
+    df = sample_fighters()
+    assert_frames_match(legacy_load_live_data(df), crawler_features(df))
+    print("✅ app.py conversion matches (text columns)")
+
+
+def test_app_numeric_columns():
+    """Newer snapshots: numeric columns written by the crawler"""
+    df = sample_fighters()
+    df['height_cm'] = [193.04, 167.64, np.nan, 180.34, np.nan, np.nan]
+    df['reach_cm'] = [200.66, 172.72, np.nan, np.nan, 177.8, 187.96]
+    df['weight_lbs'] = [205.0, 135.0, np.nan, 155.0, 155.0, np.nan]
+    for stance in ('orthodox', 'southpaw', 'switch', 'open_stance'):
+        df[f'stance_{stance}'] = [s.lower().replace(' ', '_') == stance if isinstance(s, str) else False
+                                  for s in df['stance']]
+    assert_frames_match(legacy_load_live_data(df), crawler_features(df))
+    print("✅ app.py conversion matches (numeric columns)")
+
+
+def test_app_live_conversion():
+    """app_live.py: one fighter dict at a time, reach estimated from height"""
+    df = sample_fighters()
+    converted = crawler_features(df, estimate_reach=True)
+    for i, record in enumerate(df.to_dict(orient='records')):
+        expected = legacy_convert_to_prediction_format(record)
+        actual = converted.iloc[i, 1:]
+        assert list(expected) == list(actual.index)
+        np.testing.assert_allclose(actual.to_numpy(dtype=float), list(expected.values()),
+                                   err_msg=record['name'])
+    print("✅ app_live.py conversion matches")
+
+
+def test_crawled_age():
+    """Age from newer crawls, 30 where the birth date was unknown"""
+    df = sample_fighters()
+    df['age'] = [38.0, 34.0, np.nan, 29.0, '', 41.0]
+    converted = crawler_features(df)
+    np.testing.assert_allclose(converted['age'].to_numpy(dtype=float), [38, 34, 30, 29, 30, 41])
+    print("✅ Crawled age is used")
+
+
+def test_crawler_file():
+    """The whole crawler snapshot, when it is available"""
+    if not os.path.exists(CRAWLER_PATH):
+        print("⚠️ Crawler data not found, skipping full-file parity")
+        return
+    # The old app.py set age 30 for everyone, so compare without the crawled age
+    df = pd.read_csv(CRAWLER_PATH).drop(columns=['age'], errors='ignore')
+    text_only = df.drop(columns=[c for c in df.columns
+                                 if c.endswith(('_cm', '_lbs')) or c.startswith('stance_')])
+    assert_frames_match(legacy_load_live_data(text_only), crawler_features(text_only))
+    assert_frames_match(legacy_load_live_data(df), crawler_features(df))
+    print(f"✅ Conversion matches for all {len(df)} crawler fighters")
+
+
+if __name__ == "__main__":
+    test_app_text_columns()
+    test_app_numeric_columns()
+    test_app_live_conversion()
+    test_crawled_age()
+    test_crawler_file()
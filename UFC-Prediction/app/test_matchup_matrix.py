@@ -0,0 +1,108 @@
+import os
+import pickle
+import tempfile
+import numpy as np
+import pandas as pd
+from feature_store import FEATURE_COLUMNS, FeatureStore
+from matchup_matrix import MatchupMatrix, build, load_fighters
+
+# matchup_matrix.build against a stub model: every looked-up winner must be
+# the model's own predict, also when the probabilities are stored as
+# float16, and a matrix is never reused for another model.
+
+
+class StubModel:
+    """predict_proba / predict like the ensemble's, close to 0.5 on purpose"""
+    classes_ = np.array([0, 1])
+
+    def __init__(self, scale=1e-4):
+        self.scale = scale
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        n = X.shape[1] // 2
+        p = 1 / (1 + np.exp(-self.scale * (X[:, :n].sum(1) - X[:, n:].sum(1))))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def sample_fighters(directory):
+    """FIGHTER_STAT-style csv: 8 lightweights and 6 welterweights"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.uniform(0, 20, size=(14, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+    df['Weight_lbs'] = [155.0] * 8 + [170.0] * 6
+    df.insert(0, 'fighter', [f'Fighter {i}' for i in range(14)])
+    df.insert(0, 'ID', range(1, 15))
+    df['date'] = '2024-01-01'
+    path = os.path.join(directory, 'FIGHTER_STAT.csv')
+    df.to_csv(path, index=False)
+    return path
+
+
+def save_model(directory, model):
+    path = os.path.join(directory, 'model.sav')
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+    return path
+
+
+def test_lookups_match_model():
+    """winner() is predict and probability() is predict_proba, per pair"""
+    with tempfile.TemporaryDirectory() as directory:
+        fighters = sample_fighters(directory)
+        model = StubModel()
+        model_path = save_model(directory, model)
+        store = FeatureStore.from_csv(fighters)
+        for dtype in ('float32', 'float16'):
+            build(fighters, model_path, root=os.path.join(directory, dtype), dtype=dtype, workers=2)
+            matrix = MatchupMatrix.find(fighters, model_path, root=os.path.join(directory, dtype))
+            assert matrix is not None
+            pairs = [(b, r) for e in matrix.index['divisions'].values()
+                     for b in e['fighters'] for r in e['fighters'] if b != r]
+            assert len(pairs) == 8 * 7 + 6 * 5
+            X = store.matchups(pairs)
+            expected = model.predict(X)
+            proba = model.predict_proba(X)[:, 1]
+            assert [matrix.winner(b, r) for b, r in pairs] == expected.tolist()
+            np.testing.assert_allclose([matrix.probability(b, r) for b, r in pairs], proba,
+                                       atol=1e-3 if dtype == 'float16' else 1e-6)
+            # Across divisions and against themselves: not in the matrix
+            assert matrix.winner('Fighter 0', 'Fighter 13') is None
+            assert matrix.winner('Fighter 0', 'Fighter 0') is None
+    print("✅ Matrix lookups match the model (float32 and float16)")
+
+
+def test_fights_needs_fighter_ids():
+    """--fights with a FIGHTER_STAT csv is rejected instead of dropping every fighter"""
+    with tempfile.TemporaryDirectory() as directory:
+        fighters = sample_fighters(directory)
+        fights = os.path.join(directory, 'fight_info.csv')
+        pd.DataFrame({'fighter_1_id': ['a'], 'fighter_2_id': ['b'], 'date': ['2024-01-01'],
+                      'weight_class': ['Lightweight Bout']}).to_csv(fights, index=False)
+        try:
+            load_fighters(fighters, fights)
+        except ValueError as e:
+            assert 'fighter_id' in str(e)
+        else:
+            raise AssertionError('--fights with FIGHTER_STAT.csv was accepted')
+    print("✅ --fights needs a crawler snapshot")
+
+
+def test_new_model_gets_new_matrix():
+    """find() only returns matrices built from this snapshot and model"""
+    with tempfile.TemporaryDirectory() as directory:
+        fighters = sample_fighters(directory)
+        model_path = save_model(directory, StubModel())
+        build(fighters, model_path, root=directory, workers=1)
+        assert MatchupMatrix.find(fighters, model_path, root=directory) is not None
+        save_model(directory, StubModel(scale=2e-4))
+        assert MatchupMatrix.find(fighters, model_path, root=directory) is None
+    print("✅ A retrained model does not reuse the old matrix")
+
+
+if __name__ == "__main__":
+    test_lookups_match_model()
+    test_fights_needs_fighter_ids()
+    test_new_model_gets_new_matrix()
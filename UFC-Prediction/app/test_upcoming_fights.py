@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 import pickle
 from typing import List, Dict, Any
+from feature_store import FeatureStore
 
 class UFC_Predictor:
     def __init__(self, data_path: str, model_path: str):
@@ -9,6 +10,7 @@ class UFC_Predictor:
         self.data_path = data_path
         self.model_path = model_path
         self.df = None
+        self.store = None
         self.model = None
         self.load_data_and_model()
 
@@ -16,6 +18,7 @@ class UFC_Predictor:
         """Load fighter data and trained model"""
         try:
             self.df = pd.read_csv(self.data_path)
+            self.store = FeatureStore.from_frame(self.df)
             print(f"✅ Loaded {len(self.df)} fighters with enhanced stats")
 
             with open(self.model_path, 'rb') as f:
@@ -74,27 +77,10 @@ class UFC_Predictor:
     def predict_fight(self, fighter1: str, fighter2: str) -> Dict[str, Any]:
         """Predict the outcome of a fight between two fighters"""
         try:
-            # Get fighter data
-            f1_data = self.get_fighter_stats(fighter1)
-            f2_data = self.get_fighter_stats(fighter2)
-
-            # Extract features (skip ID, date, fighter name)
-            f1_features = f1_data.iloc[:, 3:]
-            f2_features = f2_data.iloc[:, 3:]
-
-            # Create Blue vs Red format (fighter1 = Blue, fighter2 = Red)
-            blue_features = f1_features.copy()
-            blue_features.columns = ['B_' + col for col in blue_features.columns]
-
-            red_features = f2_features.copy()
-            red_features.columns = ['R_' + col for col in red_features.columns]
-
-            # Combine features
-            combined = pd.concat([blue_features.reset_index(drop=True),
-                                 red_features.reset_index(drop=True)], axis=1)
+            # Blue vs Red format (fighter1 = Blue, fighter2 = Red)
+            features = self.store.matchup(fighter1, fighter2)
 
             # Make prediction
-            features = combined.values
             prediction = self.model.predict(features)
             winner_idx = prediction[0]  # 1 = Blue wins, 0 = Red wins
 
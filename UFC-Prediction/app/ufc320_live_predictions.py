@@ -4,6 +4,8 @@ import os
 import requests
 from typing import List, Dict, Any
 import numpy as np
+from crawler_data import read_crawler_table
+from feature_store import FeatureStore
 
 class UFC_Live_Predictor:
     def __init__(self, crawler_data_path: str, model_path: str):
@@ -11,6 +13,7 @@ class UFC_Live_Predictor:
         self.crawler_data_path = crawler_data_path
         self.model_path = model_path
         self.crawler_df = None
+        self.store = None
         self.model = None
         self.load_system()
 
@@ -20,7 +23,7 @@ class UFC_Live_Predictor:
             # Load latest fighter data from crawler
             latest_file = os.path.join(self.crawler_data_path, "latest.csv")
             if os.path.exists(latest_file):
-                self.crawler_df = pd.read_csv(latest_file)
+                self.crawler_df = read_crawler_table(latest_file)
                 print(f"✅ Loaded {len(self.crawler_df)} fighters from live crawler data")
             else:
                 print("❌ No latest crawler data found")
@@ -34,6 +37,11 @@ class UFC_Live_Predictor:
             # Clean and standardize fighter names
             self.crawler_df['name'] = self.crawler_df['name'].str.strip()
             self.crawler_df['name_search'] = self.crawler_df['name'].str.lower().str.replace(r'[^\w\s]', '', regex=True)
+            self.crawler_df = self.crawler_df.reset_index(drop=True)
+
+            # Convert every fighter once; crawler_df row i is store row i
+            self.store = FeatureStore.from_frame(
+                self.convert_crawler_to_prediction_format(self.crawler_df))
             
             return True
 
@@ -123,26 +131,10 @@ class UFC_Live_Predictor:
 
             print(f"✅ Found {f1_data['name'].iloc[0]} vs {f2_data['name'].iloc[0]}")
 
-            # Convert to prediction format
-            f1_converted = self.convert_crawler_to_prediction_format(f1_data)
-            f2_converted = self.convert_crawler_to_prediction_format(f2_data)
-
             # Create features for model (Blue vs Red format)
-            blue_features = f1_converted.iloc[:, 1:].copy()  # Skip fighter name
-            blue_features.columns = ['B_' + col for col in blue_features.columns]
-
-            red_features = f2_converted.iloc[:, 1:].copy()
-            red_features.columns = ['R_' + col for col in red_features.columns]
-
-            # Combine features
-            combined = pd.concat([blue_features.reset_index(drop=True),
-                                 red_features.reset_index(drop=True)], axis=1)
-
-            # Fill any remaining NaN values
-            combined = combined.fillna(0)
+            features = self.store.gather(f1_data.index, f2_data.index)
 
             # Make prediction
-            features = combined.values
             prediction = self.model.predict(features)
             winner_idx = prediction[0]  # 1 = Blue wins, 0 = Red wins
 
@@ -1,11 +1,24 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import pandas as pd
-import glob, os, subprocess, shlex
+import os
+import time
 from rapidfuzz import process, fuzz
 
+from ufcStats import serialize, store
+from ufcStats.jobs import JobRunner
+from ufcStats.metrics import Metrics
+from ufcStats.ngram_index import NgramIndex
+from ufcStats.snapshot import SnapshotCache, etag, etag_matches, read_table
+
 DATA_DIR = os.path.join(os.getcwd(), "data")
+# SQLite database written by the crawler's SqlitePipeline; when present,
+# point lookups are answered from its indexes instead of whole snapshots.
+STATS_DB = os.environ.get("STATS_DB", os.path.join(DATA_DIR, "ufcstats.db"))
+# Snapshot-derived responses may be reused this long before revalidating
+CACHE_MAX_AGE = int(os.environ.get("API_CACHE_MAX_AGE", "30"))
 
 app = FastAPI(title="UFC Stats API")
 
@@ -16,16 +29,13 @@ app.add_middleware(
     allow_methods=["*"], allow_headers=["*"],
 )
 
-def _latest_file(pattern: str) -> Optional[str]:
-    files = glob.glob(pattern)
-    return max(files, key=os.path.getmtime) if files else None
+metrics = Metrics()
+metrics.instrument(app)
+metrics.histogram("stage_duration_seconds", "Time spent in each stage of a lookup")
+metrics.counter("lookup_tier_total", "Fighter name lookups by the tier that resolved them")
 
-def _load_fighter_table() -> pd.DataFrame:
-    # The fighter spider writes CSVs into data/fighter_stats/
-    csv_path = _latest_file(os.path.join(DATA_DIR, "fighter_stats", "*.csv"))
-    if not csv_path:
-        raise FileNotFoundError("No fighter_stats CSV found. Run a crawl first.")
-    df = pd.read_csv(csv_path)
+def _parse_fighter_table(path: str) -> pd.DataFrame:
+    df = read_table(path)
     # normalize a name column guess
     for col in ["fighter", "fighter_name", "name", "Fighter", "Name"]:
         if col in df.columns:
@@ -38,65 +48,279 @@ def _load_fighter_table() -> pd.DataFrame:
     df["name_norm"] = df["name"].fillna("").str.strip().str.lower()
     return df
 
+# Text columns that get a trigram index alongside the name, when present.
+SEARCH_FIELDS = ["name", "nickname", "stance"]
+
+class FighterTable:
+    """One parsed fighter snapshot plus the lookup structures built from it."""
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.names = df["name"].fillna("").tolist()
+        # normalized name -> first row with that name
+        self.by_name: Dict[str, int] = {}
+        for idx, n in enumerate(df["name_norm"].tolist()):
+            self.by_name.setdefault(n, idx)
+        self.indexes = {col: NgramIndex(df[col].fillna("").astype(str).tolist())
+                        for col in SEARCH_FIELDS if col in df.columns}
+        # fighter_id -> row
+        self.by_id: Dict[str, int] = {}
+        if "fighter_id" in df.columns:
+            for idx, fid in enumerate(df["fighter_id"].tolist()):
+                if isinstance(fid, str):
+                    self.by_id.setdefault(fid, idx)
+
+class BoutTable:
+    """A fight_info or upcoming snapshot indexed by fighter_id -> bout rows."""
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.by_fighter: Dict[str, List[int]] = {}
+        for col in ["fighter_1_id", "fighter_2_id"]:
+            if col not in df.columns:
+                continue
+            for idx, fid in enumerate(df[col].tolist()):
+                if isinstance(fid, str):
+                    self.by_fighter.setdefault(fid, []).append(idx)
+        for rows in self.by_fighter.values():
+            rows.sort()
+
+    def rows_for(self, fighter_id: str) -> List[Dict[str, Any]]:
+        rows = self.by_fighter.get(fighter_id)
+        return serialize.records(self.df.iloc[rows]) if rows else []
+
+# The fighter spider writes CSVs (and Arrow snapshots, preferred when they are
+# from the newest run) into data/fighter_stats/. The parsed table is kept in memory and only
+# re-parsed when a new snapshot lands.
+_fighter_cache = SnapshotCache(
+    [os.path.join(DATA_DIR, "fighter_stats", "*.arrow"),
+     os.path.join(DATA_DIR, "fighter_stats", "*.csv")],
+    lambda path: FighterTable(_parse_fighter_table(path)),
+    missing_message="No fighter_stats CSV found. Run a crawl first.")
+
+def _bout_cache(table: str) -> SnapshotCache:
+    return SnapshotCache(
+        [os.path.join(DATA_DIR, table, "*.arrow"), os.path.join(DATA_DIR, table, "*.csv")],
+        lambda path: BoutTable(read_table(path)),
+        missing_message=f"No {table} snapshot found. Run a crawl first.")
+
+_fight_cache = _bout_cache("fight_info")
+_upcoming_cache = _bout_cache("upcoming")
+metrics.track_snapshot("fighter_stats", _fighter_cache)
+metrics.track_snapshot("fight_info", _fight_cache)
+metrics.track_snapshot("upcoming", _upcoming_cache)
+
+def _optional_snapshot(cache: SnapshotCache):
+    try:
+        return cache.get()
+    except FileNotFoundError:
+        return None
+
+def _load_fighter_table() -> FighterTable:
+    # Shared across requests: treat as read-only.
+    return _fighter_cache.get().value
+
+def _cache_headers(tag: str) -> Dict[str, str]:
+    return {"ETag": tag, "Cache-Control": f"public, max-age={CACHE_MAX_AGE}"}
+
 @app.get("/health")
 def health():
     return {"ok": True}
 
 @app.get("/fighter")
-def fighter(name: str = Query(..., description="Fighter full or partial name"),
+def fighter(request: Request, response: Response,
+            name: str = Query(..., description="Fighter full or partial name"),
             limit: int = 3):
     try:
-        df = _load_fighter_table()
+        with metrics.timer("stage_duration_seconds", route="/fighter", stage="table_load"):
+            snapshot = _fighter_cache.get()
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    headers = _cache_headers(etag(snapshot.version, "fighter", name, limit))
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    table = snapshot.value
+    df = table.df
 
-    # Fast path: substring
-    name_norm = name.strip().lower()
-    subset = df[df["name_norm"].str.contains(name_norm, na=False)]
-    if subset.empty:
+    # Fast path: substring, answered from the trigram index
+    with metrics.timer("stage_duration_seconds", route="/fighter", stage="substring"):
+        hits = table.indexes["name"].search(name)
+    if not hits:
         # Fuzzy match
-        choices = df["name"].fillna("").tolist()
-        matches = process.extract(name, choices, scorer=fuzz.WRatio, limit=limit)
+        metrics.inc("lookup_tier_total", route="/fighter", tier="fuzzy")
+        with metrics.timer("stage_duration_seconds", route="/fighter", stage="fuzzy"):
+            matches = process.extract(name, table.names, scorer=fuzz.WRatio, limit=limit)
         rows: List[Dict[str, Any]] = []
         for match_name, score, idx in matches:
-            row = df.iloc[idx].to_dict()
+            row = serialize.records(df.iloc[[idx]])[0]
             row["_match_score"] = int(score)
             rows.append(row)
         return {"query": name, "exact": False, "results": rows, "message": "Fuzzy matches"}
     else:
         # Return up to `limit` distinct names from substring match
-        names = subset["name"].dropna().unique().tolist()[:limit]
-        rows = [subset[subset["name"] == n].iloc[0].to_dict() for n in names]
+        metrics.inc("lookup_tier_total", route="/fighter", tier="substring")
+        rows = []
+        seen = set()
+        for idx in hits:
+            n = table.names[idx]
+            if n in seen:
+                continue
+            seen.add(n)
+            rows.append(serialize.records(df.iloc[[idx]])[0])
+            if len(rows) >= limit:
+                break
         return {"query": name, "exact": True, "results": rows, "message": "Substring matches"}
 
-def _run_scrapy(spider: str, extra_args: Optional[List[str]] = None) -> int:
-    cmd = ["python", "-m", "scrapy", "crawl", spider]
-    if extra_args: cmd += extra_args
-    print("Running:", " ".join(shlex.quote(c) for c in cmd))
-    return subprocess.call(cmd, cwd=os.getcwd())
+def _db_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Missing values as "", like the snapshot-backed responses
+    return [{k: ("" if v is None else v) for k, v in row.items()} for row in rows]
+
+def _fighter_by_id_db(fighter_id: str, request: Request, response: Response):
+    conn = store.connect(STATS_DB, readonly=True)
+    try:
+        with metrics.timer("stage_duration_seconds", route="/fighter/{fighter_id}", stage="db_query"):
+            result = store.fetch_one(conn, "fighters", "fighter_id", fighter_id)
+            # A database written only by ufcFights has no fighters, and one
+            # written only by ufcFighters no bouts; those come from the
+            # fighter_stats / fight_info / upcoming snapshots instead
+            fighters = _optional_snapshot(_fighter_cache) if result is None else None
+            fallback = {table: _optional_snapshot(cache)
+                        for table, cache in (("fights", _fight_cache), ("upcoming", _upcoming_cache))
+                        if store.is_empty(conn, table)}
+            bouts = {table: store.bouts_for(conn, table, fighter_id)
+                     for table in ("fights", "upcoming") if table not in fallback}
+    finally:
+        conn.close()
+    if result is None:
+        idx = fighters.value.by_id.get(fighter_id) if fighters else None
+        if idx is None:
+            raise HTTPException(status_code=404, detail=f"No fighter with id {fighter_id}")
+        result = serialize.records(fighters.value.df.iloc[[idx]])[0]
+    headers = _cache_headers(etag(store.db_version(STATS_DB), "fighter_id", fighter_id,
+                                  fighters and tuple(fighters.version),
+                                  *(s and tuple(s.version) for s in fallback.values())))
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    for table, snapshot in fallback.items():
+        bouts[table] = snapshot.value.rows_for(fighter_id) if snapshot else []
+    response.headers.update(headers)
+    return {
+        "fighter_id": fighter_id,
+        "result": _db_rows([result])[0],
+        "fights": _db_rows(bouts["fights"]),
+        "upcoming": _db_rows(bouts["upcoming"]),
+    }
+
+@app.get("/fighter/{fighter_id}")
+def fighter_by_id(fighter_id: str, request: Request, response: Response):
+    """Look a fighter up by ufcstats id, with their past and upcoming bouts."""
+    if os.path.exists(STATS_DB):
+        return _fighter_by_id_db(fighter_id, request, response)
+    try:
+        snapshot = _fighter_cache.get()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    fights = _optional_snapshot(_fight_cache)
+    upcoming = _optional_snapshot(_upcoming_cache)
+    headers = _cache_headers(etag(snapshot.version, "fighter_id", fighter_id,
+                                  fights and tuple(fights.version),
+                                  upcoming and tuple(upcoming.version)))
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
 
-@app.post("/scrape/fighters")
+    table = snapshot.value
+    idx = table.by_id.get(fighter_id)
+    if idx is None:
+        raise HTTPException(status_code=404, detail=f"No fighter with id {fighter_id}")
+    response.headers.update(headers)
+    return {
+        "fighter_id": fighter_id,
+        "result": serialize.records(table.df.iloc[[idx]])[0],
+        "fights": fights.value.rows_for(fighter_id) if fights else [],
+        "upcoming": upcoming.value.rows_for(fighter_id) if upcoming else [],
+    }
+
+class FighterBatch(BaseModel):
+    names: List[str]
+
+@app.post("/fighter/batch")
+def fighter_batch(batch: FighterBatch):
+    """Resolve a whole card in one call: exact, then substring, then one fuzzy pass."""
+    try:
+        table = _load_fighter_table()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    df = table.df
+
+    resolved: List[Optional[Dict[str, Any]]] = [None] * len(batch.names)
+    leftovers: List[int] = []
+    for i, name in enumerate(batch.names):
+        name_norm = name.strip().lower()
+        if not name_norm:
+            continue
+        idx = table.by_name.get(name_norm)
+        if idx is not None:
+            metrics.inc("lookup_tier_total", route="/fighter/batch", tier="exact")
+            resolved[i] = {"idx": idx, "score": 100, "tier": "exact"}
+            continue
+        hits = table.indexes["name"].search(name_norm)
+        if hits:
+            idx = hits[0]
+            score = fuzz.WRatio(name, table.names[idx])
+            metrics.inc("lookup_tier_total", route="/fighter/batch", tier="substring")
+            resolved[i] = {"idx": idx, "score": int(score), "tier": "substring"}
+            continue
+        leftovers.append(i)
+
+    if leftovers and table.names:
+        # One (multi-core) scoring matrix for every query the cheap tiers missed
+        metrics.inc("lookup_tier_total", len(leftovers), route="/fighter/batch", tier="fuzzy")
+        with metrics.timer("stage_duration_seconds", route="/fighter/batch", stage="fuzzy"):
+            scores = process.cdist([batch.names[i] for i in leftovers], table.names,
+                                   scorer=fuzz.WRatio, workers=-1)
+        best = scores.argmax(axis=1)
+        for row, i in enumerate(leftovers):
+            idx = int(best[row])
+            resolved[i] = {"idx": idx, "score": int(scores[row, idx]), "tier": "fuzzy"}
+
+    results: List[Dict[str, Any]] = []
+    for name, hit in zip(batch.names, resolved):
+        if hit is None:
+            results.append({"query": name, "match": None, "score": 0, "tier": None, "result": None})
+            continue
+        results.append({"query": name, "match": table.names[hit["idx"]], "score": hit["score"],
+                        "tier": hit["tier"], "result": serialize.records(df.iloc[[hit["idx"]]])[0]})
+    return {"count": len(results), "results": results}
+
+# Crawls run in the background; POST /scrape/* only queues them.
+_jobs = JobRunner(os.getcwd())
+
+def _run_scrapy(spider: str, extra_args: Optional[List[str]] = None) -> Dict[str, Any]:
+    job, coalesced = _jobs.submit(spider, extra_args)
+    return {"ok": True, "job_id": job.id, "status": job.status, "coalesced": coalesced}
+
+@app.get("/jobs")
+def jobs():
+    return {"results": [job.to_dict() for job in _jobs.list()]}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}")
+    return job.to_dict()
+
+@app.post("/scrape/fighters", status_code=202)
 def scrape_fighters():
     os.makedirs(os.path.join(DATA_DIR, "fighter_stats"), exist_ok=True)
-    rc = _run_scrapy("ufcFighters")
-    if rc != 0:
-        raise HTTPException(status_code=500, detail=f"scrapy exited {rc}")
-    return {"ok": True}
+    return _run_scrapy("ufcFighters")
 
-@app.post("/scrape/fights")
+@app.post("/scrape/fights", status_code=202)
 def scrape_fights():
     os.makedirs(os.path.join(DATA_DIR, "fight_info"), exist_ok=True)
     os.makedirs(os.path.join(DATA_DIR, "fight_stats"), exist_ok=True)
-    rc = _run_scrapy("ufcFights")
-    if rc != 0:
-        raise HTTPException(status_code=500, detail=f"scrapy exited {rc}")
-    return {"ok": True}
+    return _run_scrapy("ufcFights")
 
-@app.post("/scrape/upcoming")
+@app.post("/scrape/upcoming", status_code=202)
 def scrape_upcoming():
     os.makedirs(os.path.join(DATA_DIR, "upcoming"), exist_ok=True)
-    rc = _run_scrapy("upcoming")
-    if rc != 0:
-        raise HTTPException(status_code=500, detail=f"scrapy exited {rc}")
-    return {"ok": True}
-
+    return _run_scrapy("upcoming")
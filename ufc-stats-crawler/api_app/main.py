@@ -1,50 +1,141 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+import os
 import pandas as pd
+import threading
 from pathlib import Path
 
+from ufcStats import serialize
+from ufcStats.metrics import Metrics
+from ufcStats.ngram_index import NgramIndex
+from ufcStats.snapshot import SnapshotCache, etag, etag_matches, read_table
+
 DATA_DIR = Path("/app/data")
 FIGHTER_DIR = DATA_DIR / "fighter_stats"
 FIGHT_INFO_DIR = DATA_DIR / "fight_info"
 UPCOMING_DIR = DATA_DIR / "upcoming"
+# Snapshot-derived responses may be reused this long before revalidating
+CACHE_MAX_AGE = int(os.environ.get("API_CACHE_MAX_AGE", "30"))
 
 app = FastAPI(title="UFC Stats API")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]
 )
+# Compress larger payloads for clients that send Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+metrics = Metrics()
+metrics.instrument(app)
+metrics.histogram("stage_duration_seconds", "Time spent in each stage of a request")
+
+# keep the most common/useful columns if present
+RESULT_COLUMNS = {
+    "fighter", "name", "height", "weight", "reach", "stance", "dob",
+    "slpm", "str_acc", "sapm", "str_def", "td_avg", "td_acc",
+    "td_def", "sub_avg", "win", "loss", "draw"
+}
+MAX_PAGE_SIZE = 500
+
+class SearchTable:
+    """A fighter snapshot with trigram indexes built on first use per field."""
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        cols = [c for c in df.columns if c.lower() in RESULT_COLUMNS]
+        self.result_columns = cols or list(df.columns)
+        self._indexes: dict[str, NgramIndex] = {}
+        self._lock = threading.Lock()
+
+    def searchable(self, field: str) -> bool:
+        return field in self.df.columns and not pd.api.types.is_numeric_dtype(self.df[field])
 
-def latest_csv(folder: Path) -> Path | None:
-    files = sorted(folder.glob("*.csv"))
-    return files[-1] if files else None
+    def index(self, field: str) -> NgramIndex:
+        idx = self._indexes.get(field)
+        if idx is None:
+            with self._lock:
+                idx = self._indexes.get(field)
+                if idx is None:
+                    idx = NgramIndex(self.df[field].fillna("").astype(str).tolist())
+                    self._indexes[field] = idx
+        return idx
+
+# Arrow snapshots are memory-mapped and preferred over the CSVs of the same run
+_fighters = SnapshotCache([str(FIGHTER_DIR / "*.arrow"), str(FIGHTER_DIR / "*.csv")],
+                          lambda p: SearchTable(read_table(p)),
+                          missing_message="No fighter data yet. Run the spiders.")
+_upcoming = SnapshotCache([str(UPCOMING_DIR / "*.arrow"), str(UPCOMING_DIR / "*.csv")], read_table,
+                          missing_message="No upcoming data yet. Run the upcoming spider.")
+metrics.track_snapshot("fighter_stats", _fighters)
+metrics.track_snapshot("upcoming", _upcoming)
+
+def cache_headers(tag: str) -> dict[str, str]:
+    # GZipMiddleware sends the same body gzipped or not, so the validator is weak
+    return {"ETag": f"W/{tag}", "Cache-Control": f"public, max-age={CACHE_MAX_AGE}"}
+
+def not_modified(headers: dict[str, str]) -> Response:
+    # GZipMiddleware adds Vary: Accept-Encoding to the responses it may
+    # compress, but never sees a body here; a 304 carries the same Vary
+    return Response(status_code=304, headers={**headers, "Vary": "Accept-Encoding"})
 
 @app.get("/health")
 def health():
     return {"ok": True}
 
 @app.get("/search")
-def search(name: str = Query(..., min_length=2)):
-    """Search fighters by (case-insensitive) substring."""
-    csv = latest_csv(FIGHTER_DIR)
-    if not csv or not csv.exists():
-        raise HTTPException(503, "No fighter data yet. Run the spiders.")
-    df = pd.read_csv(csv)
-    mask = df.apply(lambda col: col.astype(str).str.contains(name, case=False, na=False) if col.dtype == "object" else False).any(axis=1)
-    out = df[mask].copy()
-    # keep the most common/useful columns if present
-    cols = [c for c in out.columns if c.lower() in {
-        "fighter", "name", "height", "weight", "reach", "stance", "dob",
-        "slpm", "str_acc", "sapm", "str_def", "td_avg", "td_acc",
-        "td_def", "sub_avg", "win", "loss", "draw"
-    }]
-    if cols:
-        out = out[cols]
-    return {"count": int(out.shape[0]), "results": out.fillna("").to_dict(orient="records")}
+def search(request: Request,
+           name: str = Query(..., min_length=2),
+           fields: str = Query("name", description="Comma-separated columns to match against"),
+           offset: int = Query(0, ge=0),
+           limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+           format: str = Query("json", pattern="^(json|ndjson)$")):
+    """Search fighters by (case-insensitive) substring over the chosen fields."""
+    try:
+        with metrics.timer("stage_duration_seconds", route="/search", stage="table_load"):
+            snapshot = _fighters.get()
+    except FileNotFoundError as e:
+        raise HTTPException(503, str(e))
+    table = snapshot.value
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    bad = [f for f in wanted if not table.searchable(f)]
+    if not wanted:
+        raise HTTPException(400, "No fields to search")
+    if bad:
+        raise HTTPException(400, f"Unsearchable fields: {', '.join(bad)}")
+    headers = cache_headers(etag(snapshot.version, "search", name, tuple(wanted), offset, limit, format))
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return not_modified(headers)
+
+    with metrics.timer("stage_duration_seconds", route="/search", stage="substring"):
+        rows = set()
+        for field in wanted:
+            rows.update(table.index(field).search(name))
+        rows = sorted(rows)
+    page = rows[offset:offset + limit]
+    out = table.df.iloc[page][table.result_columns]
+    if format == "ndjson":
+        # Rows are encoded while the response streams; the timer covers that
+        return serialize.ndjson_response(out, headers, metrics.timer(
+            "stage_duration_seconds", route="/search", stage="serialize"))
+    next_offset = offset + limit if offset + limit < len(rows) else None
+    with metrics.timer("stage_duration_seconds", route="/search", stage="serialize"):
+        return serialize.json_response({"count": len(rows), "offset": offset, "limit": limit,
+                                        "next_offset": next_offset,
+                                        "results": serialize.records(out)}, headers)
 
 @app.get("/upcoming")
-def upcoming():
-    csv = latest_csv(UPCOMING_DIR)
-    if not csv or not csv.exists():
-        raise HTTPException(503, "No upcoming data yet. Run the upcoming spider.")
-    df = pd.read_csv(csv)
-    return {"count": int(df.shape[0]), "results": df.fillna("").to_dict(orient="records")}
+def upcoming(request: Request, format: str = Query("json", pattern="^(json|ndjson)$")):
+    try:
+        with metrics.timer("stage_duration_seconds", route="/upcoming", stage="table_load"):
+            snapshot = _upcoming.get()
+    except FileNotFoundError as e:
+        raise HTTPException(503, str(e))
+    headers = cache_headers(etag(snapshot.version, "upcoming", format))
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return not_modified(headers)
+    df = snapshot.value
+    if format == "ndjson":
+        return serialize.ndjson_response(df, headers, metrics.timer(
+            "stage_duration_seconds", route="/upcoming", stage="serialize"))
+    with metrics.timer("stage_duration_seconds", route="/upcoming", stage="serialize"):
+        return serialize.json_response({"count": int(df.shape[0]), "results": serialize.records(df)}, headers)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+# Crawl throughput against the local mock site (ufcStats/mocksite.py).
+#
+# Record the site once with the HTTP cache, then benchmark offline:
+#
+#     scrapy crawl ufcFights -s HTTPCACHE_ENABLED=1   # etc. for each spider
+#     python benchmarks/bench_crawl.py --latency 0.05 --output bench.json
+#
+# Each spider runs in its own process with the mock site as its HTTP proxy,
+# in a scratch directory so no data/ or crawl state is touched. Prints one
+# JSON document: items/sec, requests/sec, time per callback and peak RSS.
+# `--compare-adaptive` runs every spider twice, with the fixed
+# DOWNLOAD_DELAY and with ADAPTIVE_THROTTLE_ENABLED, and reports the speedup.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from ufcStats.mocksite import MockSite, load_recordings  # noqa: E402
+
+SPIDERS = ['ufcFighters', 'ufcFights', 'upcoming']
+ADAPTIVE = ['ADAPTIVE_THROTTLE_ENABLED=1']
+
+
+def run_spider(spider, proxy, workdir, overrides, label=''):
+    name = f'{spider}{label}'
+    stats_file = os.path.join(workdir, f'{name}.stats.json')
+    cmd = [sys.executable, '-m', 'scrapy', 'crawl', spider,
+           '-s', f'LOG_FILE={os.path.join(workdir, name + ".log")}',
+           '-s', f'STATS_FILE={stats_file}',
+           '-s', 'CALLBACK_TIMING_ENABLED=1',
+           '-s', 'HTTPCACHE_ENABLED=0']
+    for override in overrides:
+        cmd += ['-s', override]
+    env = dict(os.environ, http_proxy=proxy, HTTP_PROXY=proxy,
+               SCRAPY_SETTINGS_MODULE='ufcStats.settings',
+               PYTHONPATH=os.pathsep.join(
+                   p for p in (ROOT, os.environ.get('PYTHONPATH')) if p))
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    result = {'exit_code': proc.returncode,
+              # KiB on Linux, bytes on macOS
+              'peak_rss_mb': round(rusage.ru_maxrss / (1024 if sys.platform != 'darwin'
+                                                       else 1024 ** 2), 1)}
+    if not os.path.exists(stats_file):
+        return result
+    with open(stats_file, encoding='utf-8') as f:
+        stats = json.load(f)
+
+    elapsed = float(stats.get('elapsed_time_seconds') or 0)
+    items = stats.get('item_scraped_count', 0)
+    requests = stats.get('downloader/request_count', 0)
+    callbacks = {}
+    for key, value in stats.items():
+        parts = key.split('/')
+        if len(parts) == 3 and parts[0] == 'callback':
+            callbacks.setdefault(parts[1], {})[parts[2]] = value
+    for timing in callbacks.values():
+        calls = timing.get('calls') or 0
+        timing['seconds'] = round(timing.get('seconds', 0), 6)
+        timing['ms_per_call'] = round(
+            1000 * timing.get('seconds', 0) / calls, 3) if calls else None
+
+    result.update({
+        'finish_reason': stats.get('finish_reason'),
+        'elapsed_seconds': round(elapsed, 3),
+        'items': items,
+        'requests': requests,
+        'responses': stats.get('downloader/response_count', 0),
+        'errors': stats.get('log_count/ERROR', 0),
+        'items_per_sec': round(items / elapsed, 2) if elapsed else None,
+        'requests_per_sec': round(requests / elapsed, 2) if elapsed else None,
+        'callbacks': callbacks,
+        'throttle': {k.split('/', 1)[1]: v for k, v in stats.items()
+                     if k.startswith('adaptive_throttle/')},
+    })
+    return result
+
+
+def compare(spider, proxy, workdir, overrides):
+    fixed = run_spider(spider, proxy, workdir, overrides, '.fixed')
+    adaptive = run_spider(spider, proxy, workdir, overrides + ADAPTIVE,
+                          '.adaptive')
+    speedup = None
+    if fixed.get('elapsed_seconds') and adaptive.get('elapsed_seconds'):
+        speedup = round(fixed['elapsed_seconds'] / adaptive['elapsed_seconds'], 2)
+    return {'fixed_delay': fixed, 'adaptive': adaptive, 'speedup': speedup}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Crawl throughput against the local mock site')
+    parser.add_argument('--cache-dir',
+                        default=os.path.join(ROOT, '.scrapy', 'httpcache'),
+                        help='recorded pages (HTTP cache directory)')
+    parser.add_argument('--spider', action='append', choices=SPIDERS,
+                        help='spider to run (repeatable, default all)')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='share of mock responses that are 503')
+    parser.add_argument('--compare-adaptive', action='store_true',
+                        help='fixed delay vs adaptive throttling')
+    parser.add_argument('-s', '--set', action='append', default=[],
+                        metavar='NAME=VALUE', help='extra Scrapy setting')
+    parser.add_argument('--output', help='also write the JSON here')
+    args = parser.parse_args()
+
+    pages = load_recordings(args.cache_dir)
+    if not pages:
+        parser.error(f'no recorded pages in {args.cache_dir}; crawl once '
+                     'with -s HTTPCACHE_ENABLED=1 first')
+
+    site = MockSite(pages, latency=args.latency, jitter=args.jitter,
+                    error_rate=args.error_rate).start()
+    report = {'mock_site': {'pages': len(pages), 'latency': args.latency,
+                            'jitter': args.jitter,
+                            'error_rate': args.error_rate},
+              'settings': args.set, 'spiders': {}}
+    run = compare if args.compare_adaptive else run_spider
+    try:
+        with tempfile.TemporaryDirectory(prefix='bench_crawl_') as workdir:
+            for spider in args.spider or SPIDERS:
+                report['spiders'][spider] = run(spider, site.url, workdir,
+                                                args.set)
+    finally:
+        site.stop()
+
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(out + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+# Compare the old /upcoming and /search response path (fillna + to_dict +
+# FastAPI's encoder) with ufcStats.serialize on a real fighter table.
+#
+#     python benchmarks/bench_serialize.py [data/fighter_stats/latest.csv]
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ufcStats import serialize  # noqa: E402
+
+
+def old_path(df):
+    payload = {"count": int(df.shape[0]),
+               "results": df.fillna("").to_dict(orient="records")}
+    # What fastapi.responses.JSONResponse.render does
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False,
+                      allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def new_path(df):
+    return serialize.dumps({"count": int(df.shape[0]),
+                            "results": serialize.records(df)})
+
+
+def ndjson_bytes(df):
+    return b"".join(serialize.ndjson_chunks(df))
+
+
+def timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        runs.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(runs), out
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare the old and the columnar orjson response paths')
+    parser.add_argument("csv", nargs="?",
+                        default=os.path.join("data", "fighter_stats", "latest.csv"))
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    print(f"{args.csv}: {df.shape[0]} rows x {df.shape[1]} columns, "
+          f"orjson={'yes' if serialize.orjson else 'no'}")
+
+    cases = [
+        ("to_dict + jsonable_encoder", lambda: old_path(df)),
+        ("columnar + orjson", lambda: new_path(df)),
+        ("columnar + orjson, ndjson", lambda: ndjson_bytes(df)),
+    ]
+    results = {}
+    for label, fn in cases:
+        ms, body = timed(fn, args.repeat)
+        results[label] = body
+        print(f"  {label:<28} {ms:8.2f} ms  {len(body):>9} bytes")
+
+    body = results["columnar + orjson"]
+    ms, gz = timed(lambda: gzip.compress(body, 6), args.repeat)
+    print(f"  {'+ gzip (level 6)':<28} {ms:8.2f} ms  {len(gz):>9} bytes")
+
+    same = json.loads(results["to_dict + jsonable_encoder"]) == json.loads(body)
+    print(f"  payloads identical: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import os
+import tempfile
+
+from fastapi.testclient import TestClient
+
+import api
+from ufcStats import store
+from ufcStats.pipelines import SQLITE_TABLES
+from ufcStats.snapshot import SnapshotCache
+
+# GET /fighter/{id} and friends against a scratch data/ tree.
+#
+#     python test_api.py   (or pytest)
+
+FIGHTERS = 'fighter_id,name,height,reach,stance\nf1,Alex Pereira,"6\' 4""","79""",Orthodox\n'
+FIGHTS = 'fight_id,fighter_1_id,fighter_2_id,winner\nx1,f1,f2,f1\n'
+
+
+def use_data(directory, tables):
+    """Write `tables` ({table: csv text}) under `directory` and point the API there."""
+    for table, text in tables.items():
+        os.makedirs(os.path.join(directory, table), exist_ok=True)
+        with open(os.path.join(directory, table, '2025-01-01T00-00-00.csv'), 'w') as f:
+            f.write(text)
+    api.STATS_DB = os.path.join(directory, 'ufcstats.db')
+    # Fresh caches, so nothing is served from a previous test's tree
+    for name in ('_fighter_cache', '_fight_cache', '_upcoming_cache'):
+        cache = getattr(api, name)
+        patterns = [os.path.join(directory, os.path.basename(os.path.dirname(p)), os.path.basename(p))
+                    for p in cache.pattern]
+        setattr(api, name, SnapshotCache(patterns, cache.loader))
+    return TestClient(api.app)
+
+
+def write_db(directory, **rows):
+    conn = store.connect(os.path.join(directory, 'ufcstats.db'))
+    with conn:
+        for table in SQLITE_TABLES.values():
+            store.ensure_table(conn, table)
+        for name, table_rows in rows.items():
+            store.upsert(conn, SQLITE_TABLES[name], table_rows)
+    conn.close()
+
+
+def test_fighter_by_id_snapshots():
+    """No database: fighter and bouts from the snapshots"""
+    with tempfile.TemporaryDirectory() as directory:
+        client = use_data(directory, {'fighter_stats': FIGHTERS, 'fight_info': FIGHTS})
+        r = client.get('/fighter/f1')
+        assert r.status_code == 200
+        assert r.json()['result']['name'] == 'Alex Pereira'
+        assert [f['fight_id'] for f in r.json()['fights']] == ['x1']
+        assert client.get('/fighter/nobody').status_code == 404
+    print("✅ /fighter/{id} from snapshots")
+
+
+def test_fighter_by_id_fights_only_db():
+    """A database from ufcFights only: the fighter comes from the snapshot"""
+    with tempfile.TemporaryDirectory() as directory:
+        client = use_data(directory, {'fighter_stats': FIGHTERS, 'fight_info': FIGHTS})
+        write_db(directory, fights=[{'fight_id': 'y9', 'fighter_1_id': 'f1', 'fighter_2_id': 'f3'}])
+        r = client.get('/fighter/f1')
+        assert r.status_code == 200
+        assert r.json()['result']['name'] == 'Alex Pereira'
+        # Bouts still come from the database, which has them
+        assert [f['fight_id'] for f in r.json()['fights']] == ['y9']
+        assert client.get('/fighter/f1', headers={'if-none-match': r.headers['etag']}).status_code == 304
+        assert client.get('/fighter/nobody').status_code == 404
+    print("✅ /fighter/{id} with a fights-only database")
+
+
+def test_fighter_by_id_fighters_only_db():
+    """A database from ufcFighters only: bouts come from the snapshot"""
+    with tempfile.TemporaryDirectory() as directory:
+        client = use_data(directory, {'fighter_stats': FIGHTERS, 'fight_info': FIGHTS})
+        write_db(directory, fighters=[{'fighter_id': 'f1', 'name': 'Alex Pereira (db)'}])
+        r = client.get('/fighter/f1')
+        assert r.status_code == 200
+        assert r.json()['result']['name'] == 'Alex Pereira (db)'
+        assert [f['fight_id'] for f in r.json()['fights']] == ['x1']
+    print("✅ /fighter/{id} with a fighters-only database")
+
+
+def test_missing_reach():
+    """ufcstats shows -- for unknown values; reach_cm is then empty (NaN)"""
+    fighters = ('fighter_id,name,reach,reach_cm,age\n'
+                'f1,Alex Pereira,79",200.66,38\n'
+                'f9,Some Guy,--,,\n')
+    with tempfile.TemporaryDirectory() as directory:
+        client = use_data(directory, {'fighter_stats': fighters})
+        r = client.get('/fighter', params={'name': 'some guy'})
+        assert r.status_code == 200
+        assert r.json()['results'][0]['reach_cm'] == ''
+        r = client.get('/fighter', params={'name': 'Sme Guy'})
+        assert r.status_code == 200
+        r = client.post('/fighter/batch', json={'names': ['Some Guy', 'Alex Pereira']})
+        assert r.status_code == 200
+        assert [x['result']['age'] for x in r.json()['results']] == ['', 38.0]
+        assert client.get('/fighter/f9').status_code == 200
+    print("✅ Fighters with missing values serialize")
+
+
+if __name__ == "__main__":
+    test_fighter_by_id_snapshots()
+    test_fighter_by_id_fights_only_db()
+    test_fighter_by_id_fighters_only_db()
+    test_missing_reach()
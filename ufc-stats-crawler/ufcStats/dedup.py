@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+# Keys of items that were already scraped.
+#
+# Within a run the DedupPipeline keeps a plain set of keys per item class.
+# Keys can also be persisted between runs: each one is reduced to a 64-bit
+# hash and stored as a sorted uint64 array (8 bytes per fight), which loads
+# back into a set of ints in milliseconds.
+
+import hashlib
+import os
+from array import array
+
+
+def key_hash(key):
+    digest = hashlib.blake2b(str(key).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class KeySet(object):
+    """A set of 64-bit key hashes, stored as a sorted uint64 file at `path`."""
+    def __init__(self, path=None):
+        self.path = path
+        self.hashes = set()
+        if path and os.path.exists(path):
+            keys = array('Q')
+            with open(path, 'rb') as f:
+                keys.frombytes(f.read())
+            self.hashes = set(keys)
+
+    def __contains__(self, key):
+        return key_hash(key) in self.hashes
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, key):
+        self.hashes.add(key_hash(key))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(array('Q', sorted(self.hashes)).tobytes())
+        os.replace(tmp, self.path)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+# Scrapy extensions for the ufcStats crawlers.
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from ufcStats.incremental import detail_id
+from ufcStats.utils import print_time
+
+
+class StatsFile(object):
+    """
+    Write the final crawl stats as JSON to the STATS_FILE setting, so
+    scripts (e.g. benchmarks/bench_crawl.py) can read them back.
+    """
+    def __init__(self, path, stats):
+        self.path = path
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get('STATS_FILE')
+        if not path:
+            raise NotConfigured
+        ext = cls(path, crawler.stats)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_closed(self, spider, reason):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.stats.get_stats(), f, indent=2, sort_keys=True,
+                      default=str)
+
+
+# Sent by CallbackTimingMiddleware: callback_timed(name, seconds) once per
+# response, item_yielded(item) for every item a callback yields
+callback_timed = object()
+item_yielded = object()
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def summarize(values):
+    """Count, total, mean, percentiles (nearest rank) and max of `values`."""
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+    n = len(values)
+    total = sum(values)
+    summary = {'count': n, 'total': round(total, 6), 'mean': round(total / n, 6)}
+    for p in PERCENTILES:
+        summary[f'p{p}'] = round(values[max(0, -(-n * p // 100) - 1)], 6)
+    summary['max'] = round(values[-1], 6)
+    return summary
+
+
+def _page_kind(url):
+    """'event', 'fight', 'fighter' for ufcstats details pages, else the path."""
+    kind, _ = detail_id(url)
+    if kind:
+        return kind
+    return urlsplit(url).path.strip('/').split('/')[0] or '/'
+
+
+class CrawlProfile(object):
+    """
+    Write distributions the end-of-run stats don't show to a JSON file next
+    to the log (log/<time>.profile.json, or CRAWL_PROFILE_FILE):
+
+    - download latency and response size per page kind (event, fight,
+      fighter, ...), as percentiles;
+    - parse time per spider callback;
+    - pipeline time per item class, from the moment the callback yields
+      the item until it is scraped or dropped;
+    - responses and items per CRAWL_PROFILE_INTERVAL seconds over the run.
+    """
+    def __init__(self, path, interval, crawler):
+        self.path = path
+        self.interval = interval
+        self.crawler = crawler
+        self.latency = defaultdict(list)
+        self.sizes = defaultdict(list)
+        self.callbacks = defaultdict(list)
+        self.pipelines = defaultdict(list)
+        self.dropped = defaultdict(int)
+        self.pending = {}
+        self.timeline = defaultdict(lambda: [0, 0])
+        self.started = None
+        self.started_at = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('CRAWL_PROFILE_ENABLED'):
+            raise NotConfigured
+        path = settings.get('CRAWL_PROFILE_FILE')
+        if not path:
+            log_file = settings.get('LOG_FILE')
+            path = (f'{os.path.splitext(log_file)[0]}.profile.json' if log_file
+                    else os.path.join('log', f"{print_time('now')}.profile.json"))
+        ext = cls(path, settings.getfloat('CRAWL_PROFILE_INTERVAL', 10), crawler)
+        for handler, signal in (
+                (ext.spider_opened, signals.spider_opened),
+                (ext.spider_closed, signals.spider_closed),
+                (ext.response_received, signals.response_received),
+                (ext.callback_timed, callback_timed),
+                (ext.item_yielded, item_yielded),
+                (ext.item_scraped, signals.item_scraped),
+                (ext.item_dropped, signals.item_dropped),
+                (ext.item_error, signals.item_error)):
+            crawler.signals.connect(handler, signal=signal)
+        return ext
+
+    def _bucket(self):
+        return int((time.monotonic() - self.started) // self.interval)
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    def response_received(self, response, request, spider):
+        kind = _page_kind(response.url)
+        latency = request.meta.get('download_latency')
+        # No latency for responses served from the HTTP cache
+        if latency is not None:
+            self.latency[kind].append(latency)
+        self.sizes[kind].append(len(response.body))
+        self.timeline[self._bucket()][0] += 1
+
+    def callback_timed(self, name, seconds):
+        self.callbacks[name].append(seconds)
+
+    def item_yielded(self, item):
+        self.pending[id(item)] = time.perf_counter()
+
+    def _item_done(self, item):
+        start = self.pending.pop(id(item), None)
+        if start is not None:
+            self.pipelines[type(item).__name__].append(time.perf_counter() - start)
+
+    def item_scraped(self, item, response, spider):
+        self._item_done(item)
+        self.timeline[self._bucket()][1] += 1
+
+    def item_dropped(self, item, response, exception, spider):
+        self._item_done(item)
+        self.dropped[type(item).__name__] += 1
+
+    def item_error(self, item, response, spider, failure):
+        self._item_done(item)
+
+    def profile(self, spider, reason):
+        elapsed = time.monotonic() - self.started
+        last = max(self.timeline, default=-1)
+        timeline = []
+        for bucket in range(last + 1):
+            responses, items = self.timeline.get(bucket, (0, 0))
+            timeline.append({
+                'start_seconds': bucket * self.interval,
+                'responses': responses,
+                'items': items,
+                'items_per_sec': round(items / self.interval, 3),
+            })
+        return {
+            'spider': spider.name,
+            'started_at': self.started_at,
+            'elapsed_seconds': round(elapsed, 3),
+            'finish_reason': reason,
+            'download_latency_seconds': {k: summarize(v) for k, v in self.latency.items()},
+            'response_bytes': {k: summarize(v) for k, v in self.sizes.items()},
+            'callback_seconds': {k: summarize(v) for k, v in self.callbacks.items()},
+            'pipeline_seconds': {k: summarize(v) for k, v in self.pipelines.items()},
+            'items_dropped': dict(self.dropped),
+            'throughput': {'interval_seconds': self.interval, 'buckets': timeline},
+        }
+
+    def spider_closed(self, spider, reason):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.profile(spider, reason), f, indent=2)
+        spider.logger.info('Crawl profile written to %s', self.path)
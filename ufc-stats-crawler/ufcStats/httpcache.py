@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+# Disk-backed HTTP cache for the spiders.
+#
+# Built on Scrapy's HttpCacheMiddleware and filesystem storage. The policy
+# keeps fight-details pages forever (a finished fight never changes) and
+# re-fetches every other page (event lists, fighter pages, upcoming cards)
+# once it is older than HTTPCACHE_PAGE_EXPIRATION_SECS.
+#
+# Replay mode (`-s HTTPCACHE_REPLAY=1`) serves every request from the cache,
+# however old, and drops requests that were never cached instead of going
+# to ufcstats.com, so parser changes can be re-run offline over a full crawl.
+
+import time
+
+from scrapy import signals
+from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from scrapy.extensions.httpcache import DummyPolicy, rfc1123_to_epoch
+from scrapy.settings import Settings
+
+from ufcStats.incremental import detail_id
+
+
+class UfcStatsCachePolicy(DummyPolicy):
+    """
+    Cache everything except ignored status codes; only fight-details pages
+    are fresh forever.
+    """
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.replay = settings.getbool('HTTPCACHE_REPLAY')
+        self.page_expiration = settings.getint('HTTPCACHE_PAGE_EXPIRATION_SECS')
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        if self.replay or self.page_expiration <= 0:
+            return True
+        kind, _ = detail_id(request.url)
+        if kind == 'fight':
+            return True
+        date = rfc1123_to_epoch(cachedresponse.headers.get(b'Date'))
+        return date is not None and time.time() - date < self.page_expiration
+
+
+class CacheMiddleware(HttpCacheMiddleware):
+    """HttpCacheMiddleware that switches itself on for replay mode."""
+    @classmethod
+    def from_crawler(cls, crawler):
+        if crawler.settings.getbool('HTTPCACHE_REPLAY'):
+            settings = Settings(crawler.settings.copy_to_dict())
+            settings.set('HTTPCACHE_ENABLED', True)
+            settings.set('HTTPCACHE_IGNORE_MISSING', True)
+            mw = cls(settings, crawler.stats)
+            crawler.signals.connect(mw.spider_opened, signal=signals.spider_opened)
+            crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+            mw.crawler = crawler
+            return mw
+        return super().from_crawler(crawler)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+# Incremental crawl support.
+#
+# Every run records what it scraped in a small persisted CrawlState: fight
+# ids, fully scraped events, fighters, and fighters who fought since their
+# page was last scraped. A run started with `-a incremental=1` (or the
+# INCREMENTAL_CRAWL setting) then drops requests for events, fights and
+# fighters that are already up to date, and the pipelines merge the new rows
+# into the previous snapshot instead of replacing it.
+
+import csv
+import glob
+import json
+import os
+import re
+
+from scrapy import Request, signals
+
+from ufcStats.items import FightsItem, FighterSummaryItem
+from ufcStats.jsonlines import iter_jsonlines
+
+_DETAIL_URL = re.compile(r'/(event|fight|fighter)-details/([0-9a-f]+)')
+
+
+def is_incremental(spider):
+    flag = getattr(spider, 'incremental', None)
+    if flag is None:
+        return spider.settings.getbool('INCREMENTAL_CRAWL', False)
+    return str(flag).lower() in ('1', 'true', 'yes', 'on')
+
+
+def detail_id(url):
+    """('event' | 'fight' | 'fighter', id) for a ufcstats details page."""
+    m = _DETAIL_URL.search(url or '')
+    return (m.group(1), m.group(2)) if m else (None, None)
+
+
+def previous_snapshot(directory, suffix, exclude=None):
+    """
+    Newest file in `directory` ending in `suffix` (or one of a tuple of
+    suffixes) other than `exclude`.
+    """
+    files = [f for f in glob.glob(os.path.join(directory, '*'))
+             if f.endswith(suffix) and (exclude is None or
+                                        os.path.abspath(f) != os.path.abspath(exclude))]
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def read_rows(path):
+    """Rows of a CSV or (possibly compressed) JSON-lines snapshot, as dicts."""
+    if not path.endswith('.csv'):
+        return list(iter_jsonlines(path))
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def carried_over(directory, suffix, exclude, key, seen):
+    """Rows of the previous snapshot whose `key` this run did not rewrite."""
+    path = previous_snapshot(directory, suffix, exclude)
+    if path is None:
+        return []
+    return [row for row in read_rows(path) if key(row) not in seen]
+
+
+class CrawlState(object):
+    """
+    What earlier runs scraped, persisted as JSON (CRAWL_STATE_FILE).
+    """
+    FIELDS = ('seen_events', 'seen_fights', 'seen_fighters', 'stale_fighters')
+
+    def __init__(self, path):
+        self.path = path
+        data = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        for field in self.FIELDS:
+            setattr(self, field, set(data.get(field, [])))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({field: sorted(getattr(self, field))
+                       for field in self.FIELDS}, f)
+        os.replace(tmp, self.path)
+
+
+class IncrementalMiddleware(object):
+    """
+    Spider middleware that keeps CrawlState up to date on every run and, in
+    incremental mode, drops detail-page requests that would not change the
+    snapshot: events already fully scraped, fights already seen, and
+    fighters who have not fought since their page was last scraped.
+    """
+    def __init__(self, state_path, stats):
+        self.state_path = state_path
+        self.stats = stats
+        self.enabled = False
+        self.state = None
+        # event id -> fight ids requested from it and not yet scraped
+        self.pending = {}
+        self.fight_event = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        mw = cls(crawler.settings.get('CRAWL_STATE_FILE'), crawler.stats)
+        crawler.signals.connect(mw.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(mw.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        return mw
+
+    def spider_opened(self, spider):
+        self.state = CrawlState(self.state_path)
+        self.enabled = is_incremental(spider)
+        if self.enabled:
+            spider.logger.info(
+                'Incremental crawl: %d events, %d fights, %d fighters known, '
+                '%d fighters to refresh', len(self.state.seen_events),
+                len(self.state.seen_fights), len(self.state.seen_fighters),
+                len(self.state.stale_fighters))
+
+    def _skip(self, request, response):
+        kind, ident = detail_id(request.url)
+        if kind == 'fight':
+            if self.enabled and ident in self.state.seen_fights:
+                return kind
+            parent_kind, event = detail_id(response.url if response else None)
+            if parent_kind == 'event':
+                self.pending.setdefault(event, set()).add(ident)
+                self.fight_event[ident] = event
+        elif not self.enabled:
+            return None
+        elif kind == 'event' and ident in self.state.seen_events:
+            return kind
+        elif (kind == 'fighter' and ident in self.state.seen_fighters
+              and ident not in self.state.stale_fighters):
+            return kind
+        return None
+
+    def _keep(self, r, response, spider):
+        if isinstance(r, Request):
+            skipped = self._skip(r, response)
+            if skipped:
+                self.stats.inc_value(f'incremental/skipped/{skipped}',
+                                     spider=spider)
+                return False
+        return True
+
+    def _visited(self, response):
+        kind, event = detail_id(response.url)
+        if kind == 'event':
+            self.pending.setdefault(event, set())
+
+    def process_start_requests(self, start_requests, spider):
+        for r in start_requests:
+            if self._keep(r, None, spider):
+                yield r
+
+    def process_spider_output(self, response, result, spider):
+        self._visited(response)
+        for r in result:
+            if self._keep(r, response, spider):
+                yield r
+
+    async def process_spider_output_async(self, response, result, spider):
+        self._visited(response)
+        async for r in result:
+            if self._keep(r, response, spider):
+                yield r
+
+    def item_scraped(self, item, response, spider):
+        if isinstance(item, FightsItem):
+            fight_id = item.get('fight_id')
+            self.state.seen_fights.add(fight_id)
+            self.pending.get(self.fight_event.get(fight_id), set()).discard(fight_id)
+            for key in ('fighter_1_id', 'fighter_2_id'):
+                if item.get(key):
+                    self.state.stale_fighters.add(item[key])
+        elif isinstance(item, FighterSummaryItem):
+            self.state.seen_fighters.add(item.get('fighter_id'))
+            self.state.stale_fighters.discard(item.get('fighter_id'))
+
+    def spider_closed(self, spider, reason):
+        # An event only counts as done once every fight on it was scraped
+        done = [event for event, fights in self.pending.items() if not fights]
+        self.state.seen_events.update(done)
+        self.state.save()
+        self.stats.set_value('incremental/events_completed', len(done),
+                             spider=spider)
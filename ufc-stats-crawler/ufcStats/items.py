@@ -114,3 +114,12 @@ class FighterSummaryItem(scrapy.Item):
     td_def_pct = scrapy.Field(
         output_processor=Compose(TakeFirst(), stripPercent))
     sub_avg = scrapy.Field(output_processor=STR_toFloat)
+    ## Numeric columns, filled in by FighterNumbersPipeline
+    height_cm = scrapy.Field()
+    reach_cm = scrapy.Field()
+    weight_lbs = scrapy.Field()
+    age = scrapy.Field()
+    stance_orthodox = scrapy.Field()
+    stance_southpaw = scrapy.Field()
+    stance_switch = scrapy.Field()
+    stance_open_stance = scrapy.Field()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# Background scrape jobs for the stats API.
+#
+# A full ufcFighters crawl runs for ~45 minutes, so the API must not hold a
+# worker on `subprocess.call`. Jobs run `scrapy crawl` in a child process on a
+# worker thread; at most `max_concurrent` crawls run at once and the rest wait
+# in the queue. Submitting a spider that is already queued or running returns
+# the existing job instead of starting a second crawl.
+
+import os
+import re
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+
+MAX_CONCURRENT_JOBS = int(os.environ.get('SCRAPE_MAX_CONCURRENT', '2'))
+# Finished jobs kept around for GET /jobs/{id}
+MAX_FINISHED_JOBS = 100
+
+# LogStats progress lines and the final stats dump both carry the item count
+_ITEMS_RE = re.compile(
+    rb"scraped (\d+) items|'item_scraped_count': (\d+)")
+
+
+class ScrapeJob(object):
+    def __init__(self, spider, args, log_dir):
+        self.id = uuid.uuid4().hex[:12]
+        self.spider = spider
+        self.args = list(args)
+        self.log_path = os.path.join(log_dir, f'job-{self.id}.log')
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.exit_code = None
+        self.error = None
+        self.items_scraped = 0
+        self._log_offset = 0
+        self._log_lock = threading.Lock()
+
+    @property
+    def key(self):
+        return (self.spider, tuple(self.args))
+
+    @property
+    def done(self):
+        return self.status in ('succeeded', 'failed')
+
+    def _refresh_items(self):
+        # Only parse what was appended to the log since the last poll
+        with self._log_lock:
+            try:
+                with open(self.log_path, 'rb') as f:
+                    f.seek(self._log_offset)
+                    chunk = f.read()
+            except OSError:
+                return
+            end = chunk.rfind(b'\n') + 1
+            for m in _ITEMS_RE.finditer(chunk[:end]):
+                self.items_scraped = int(m.group(1) or m.group(2))
+            self._log_offset += end
+
+    def to_dict(self):
+        if self.started_at is not None:
+            self._refresh_items()
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        else:
+            elapsed = None
+        return {
+            'id': self.id,
+            'spider': self.spider,
+            'args': self.args,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed_seconds': elapsed,
+            'items_scraped': self.items_scraped,
+            'exit_code': self.exit_code,
+            'error': self.error,
+            'log': self.log_path,
+        }
+
+
+class JobRunner(object):
+    """
+    Run `scrapy crawl` jobs in the background with a concurrency limit.
+    """
+    def __init__(self, cwd, max_concurrent=MAX_CONCURRENT_JOBS,
+                 log_dir='log'):
+        self.cwd = cwd
+        self.log_dir = os.path.join(cwd, log_dir)
+        self.jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def submit(self, spider, args=None):
+        """Queue a crawl; return `(job, coalesced)`."""
+        args = list(args or [])
+        with self._lock:
+            running = self._active.get((spider, tuple(args)))
+            if running is not None:
+                return running, True
+            os.makedirs(self.log_dir, exist_ok=True)
+            job = ScrapeJob(spider, args, self.log_dir)
+            self.jobs[job.id] = job
+            self._active[job.key] = job
+            self._prune()
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job, False
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        # submit() prunes finished jobs under the lock
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return sorted(jobs, key=lambda j: j.created_at, reverse=True)
+
+    def _prune(self):
+        finished = [j for j in self.jobs.values() if j.done]
+        finished.sort(key=lambda j: j.finished_at)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
+
+    def _run(self, job):
+        cmd = ['python', '-m', 'scrapy', 'crawl', job.spider,
+               '-s', f'LOG_FILE={job.log_path}'] + job.args
+        with self._slots:
+            job.status = 'running'
+            job.started_at = time.time()
+            print('Running:', ' '.join(shlex.quote(c) for c in cmd))
+            status = 'failed'
+            try:
+                job.exit_code = subprocess.call(cmd, cwd=self.cwd)
+                if job.exit_code == 0:
+                    status = 'succeeded'
+            except Exception as e:
+                job.error = str(e)
+            finally:
+                # _prune sorts done jobs by finished_at, so a job is only
+                # marked done once it has one
+                with self._lock:
+                    job.finished_at = time.time()
+                    job.status = status
+                    self._active.pop(job.key, None)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+# Buffered, compressed JSON-lines files.
+#
+# JsonLinesItemExporter writes one small uncompressed line per item. The
+# writer here collects rows into bounded batches, encodes them with orjson
+# (standard library json when it is not installed) and writes them through
+# a gzip or zstd stream, flushing a complete compressed block at least every
+# `flush_seconds` so the file can be stream-decompressed while it grows.
+#
+#     for row in iter_jsonlines('data/fight_stats/<time>.jl.zst'): ...
+
+import gzip
+import io
+import json
+import time
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - only needed for .zst files
+    zstandard = None
+
+# File suffix per compression mode
+SUFFIXES = {None: '.jl', 'gzip': '.jl.gz', 'zstd': '.jl.zst'}
+
+# Raised by iter_jsonlines() when a file was cut off mid-block or mid-line
+TRUNCATED_ERRORS = (EOFError, ValueError) + (
+    (zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def _encode(row):
+    if orjson is not None:
+        return orjson.dumps(row, default=str)
+    return json.dumps(row, default=str, ensure_ascii=False).encode('utf-8')
+
+
+def _need_zstd():
+    if zstandard is None:
+        raise RuntimeError('zstd compression needs the zstandard package')
+
+
+class JsonLinesWriter(object):
+    """
+    Append rows (dicts) to a JSON-lines file, optionally gzip or zstd
+    compressed. Rows are buffered and written `batch_size` at a time.
+    """
+    def __init__(self, path, compression=None, batch_size=500,
+                 flush_seconds=30.0, level=None):
+        if compression not in SUFFIXES:
+            raise ValueError(f'Unknown compression {compression!r}')
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.buffer = []
+        self.rows = 0
+        self._raw = open(path, 'wb')
+        if compression == 'gzip':
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode='wb',
+                                         compresslevel=level or 6)
+        elif compression == 'zstd':
+            _need_zstd()
+            self._stream = zstandard.ZstdCompressor(level=level or 3) \
+                .stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+        self.compression = compression
+        self._flushed_at = time.monotonic()
+
+    def write(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self._write_batch()
+        if time.monotonic() - self._flushed_at >= self.flush_seconds:
+            self.flush()
+
+    def _write_batch(self):
+        if self.buffer:
+            self._stream.write(b''.join(_encode(r) + b'\n' for r in self.buffer))
+            self.rows += len(self.buffer)
+            self.buffer = []
+
+    def flush(self):
+        """Write buffered rows and end a compressed block on disk."""
+        self._write_batch()
+        if self.compression == 'gzip':
+            self._stream.flush()
+        elif self.compression == 'zstd':
+            self._stream.flush(zstandard.FLUSH_BLOCK)
+        self._raw.flush()
+        self._flushed_at = time.monotonic()
+
+    def close(self):
+        self._write_batch()
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+
+
+def open_text(path, name=None):
+    """
+    Text stream over a .jl, .jl.gz or .jl.zst file, decompressed lazily.
+    The format is taken from `name` when given, else from `path`.
+    """
+    name = name or path
+    if name.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if name.endswith('.zst'):
+        _need_zstd()
+        raw = open(path, 'rb')
+        return io.TextIOWrapper(
+            zstandard.ZstdDecompressor().stream_reader(raw, closefd=True),
+            encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def iter_jsonlines(path, name=None):
+    """Yield the rows of a (possibly compressed) JSON-lines file."""
+    with open_text(path, name) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
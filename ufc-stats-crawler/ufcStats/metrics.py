@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+# Minimal in-process metrics for the stats APIs, rendered in the Prometheus
+# text exposition format by GET /metrics. Counters and histograms are keyed
+# by label values; snapshot caches registered with `track_snapshot` also
+# report their age, row count and load time.
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; request and stage latencies are mostly well under a second
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    inner = ','.join('{}="{}"'.format(
+        k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels)
+    return '{' + inner + '}'
+
+
+def _num(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metrics(object):
+    def __init__(self, prefix='ufc_api', buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._counters = {}
+        self._histograms = {}
+        self._snapshots = {}
+
+    def _declare(self, name, kind, help):
+        name = f'{self.prefix}_{name}'
+        self._help.setdefault(name, help)
+        self._types.setdefault(name, kind)
+        return name
+
+    def counter(self, name, help):
+        return self._declare(name, 'counter', help)
+
+    def histogram(self, name, help):
+        return self._declare(name, 'histogram', help)
+
+    def inc(self, name, value=1, **labels):
+        key = (f'{self.prefix}_{name}', tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (f'{self.prefix}_{name}', tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                # per-bucket counts, then sum and count
+                hist = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def instrument(self, app):
+        """Count and time every request of a FastAPI app; serve GET /metrics."""
+        from starlette.responses import PlainTextResponse
+
+        self.counter('requests_total', 'HTTP requests by route and status')
+        self.histogram('request_duration_seconds', 'HTTP request latency by route')
+
+        @app.middleware('http')
+        async def record_request(request, call_next):
+            start = time.perf_counter()
+            response = await call_next(request)
+            route = getattr(request.scope.get('route'), 'path', 'unmatched')
+            self.inc('requests_total', method=request.method, route=route,
+                     status=response.status_code)
+            self.observe('request_duration_seconds',
+                         time.perf_counter() - start,
+                         method=request.method, route=route)
+            return response
+
+        @app.get('/metrics', include_in_schema=False)
+        def metrics():
+            return PlainTextResponse(self.render(),
+                                     media_type='text/plain; version=0.0.4')
+
+    def track_snapshot(self, table, cache):
+        """Report age, rows and load time of a SnapshotCache as `table`."""
+        self.histogram('snapshot_load_seconds',
+                       'Time spent parsing and indexing a new snapshot')
+        cache.on_load = lambda snapshot, seconds: self.observe(
+            'snapshot_load_seconds', seconds, table=table)
+        self._snapshots[table] = cache
+
+    def _snapshot_lines(self):
+        now = time.time()
+        age, rows = [], []
+        for table, cache in sorted(self._snapshots.items()):
+            snapshot = cache.current
+            if snapshot is None:
+                continue
+            labels = _labels((('table', table),))
+            age.append(f'{self.prefix}_snapshot_age_seconds{labels} '
+                       f'{now - snapshot.version.mtime_ns / 1e9:.3f}')
+            value = getattr(snapshot.value, 'df', snapshot.value)
+            rows.append(f'{self.prefix}_snapshot_rows{labels} {len(value)}')
+        lines = []
+        for name, help, samples in (
+                ('snapshot_age_seconds', 'Seconds since the served snapshot was written', age),
+                ('snapshot_rows', 'Rows in the served snapshot', rows)):
+            if samples:
+                lines.append(f'# HELP {self.prefix}_{name} {help}')
+                lines.append(f'# TYPE {self.prefix}_{name} gauge')
+                lines.extend(samples)
+        return lines
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+
+        lines = []
+        for name in sorted(self._types):
+            kind = self._types[name]
+            lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (n, labels), value in sorted(counters.items()):
+                    if n == name:
+                        lines.append(f'{name}{_labels(labels)} {_num(value)}')
+                continue
+            for (n, labels), hist in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets, hist):
+                    cumulative += count
+                    le = labels + (('le', _num(bound)),)
+                    lines.append(f'{name}_bucket{_labels(le)} {cumulative}')
+                le = labels + (('le', '+Inf'),)
+                lines.append(f'{name}_bucket{_labels(le)} {hist[-1]}')
+                lines.append(f'{name}_sum{_labels(labels)} {_num(hist[-2])}')
+                lines.append(f'{name}_count{_labels(labels)} {hist[-1]}')
+        lines.extend(self._snapshot_lines())
+        return '\n'.join(lines) + '\n'
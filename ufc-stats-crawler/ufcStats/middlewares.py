@@ -5,7 +5,13 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import time
+
+from itemadapter import is_item
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from ufcStats.extensions import callback_timed, item_yielded
 
 
 class UfcstatsSpiderMiddleware(object):
@@ -101,3 +107,163 @@ class UfcstatsDownloaderMiddleware(object):
 
     def spider_opened(self, spider):
         spider.logger.info('Spider opened: %s' % spider.name)
+
+
+class CallbackTimingMiddleware(object):
+    """
+    Record the time spent inside each spider callback as the stats
+    `callback/<name>/seconds` and `callback/<name>/calls`.
+
+    Installed closest to the spider so only the callback's own work is
+    timed, not the other middlewares or the pipelines. Also reports each
+    callback run and yielded item to the CrawlProfile extension.
+    """
+    def __init__(self, stats, signals):
+        self.stats = stats
+        self.signals = signals
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not (settings.getbool('CALLBACK_TIMING_ENABLED')
+                or settings.getbool('CRAWL_PROFILE_ENABLED')):
+            raise NotConfigured
+        return cls(crawler.stats, crawler.signals)
+
+    def _name(self, response, spider):
+        callback = response.request.callback if response.request else None
+        return getattr(callback or spider.parse, '__name__', 'parse')
+
+    def _record(self, name, seconds):
+        self.stats.inc_value(f'callback/{name}/seconds', seconds)
+
+    def _done(self, name, seconds):
+        self.signals.send_catch_log(callback_timed, name=name, seconds=seconds)
+
+    def _yielded(self, r):
+        if is_item(r):
+            self.signals.send_catch_log(item_yielded, item=r)
+
+    def process_spider_output(self, response, result, spider):
+        name = self._name(response, spider)
+        self.stats.inc_value(f'callback/{name}/calls')
+        it = iter(result)
+        total = 0.0
+        while True:
+            start = time.perf_counter()
+            try:
+                r = next(it)
+            except StopIteration:
+                elapsed = time.perf_counter() - start
+                self._record(name, elapsed)
+                self._done(name, total + elapsed)
+                return
+            elapsed = time.perf_counter() - start
+            self._record(name, elapsed)
+            total += elapsed
+            self._yielded(r)
+            yield r
+
+    async def process_spider_output_async(self, response, result, spider):
+        name = self._name(response, spider)
+        self.stats.inc_value(f'callback/{name}/calls')
+        it = result.__aiter__()
+        total = 0.0
+        while True:
+            start = time.perf_counter()
+            try:
+                r = await it.__anext__()
+            except StopAsyncIteration:
+                elapsed = time.perf_counter() - start
+                self._record(name, elapsed)
+                self._done(name, total + elapsed)
+                return
+            elapsed = time.perf_counter() - start
+            self._record(name, elapsed)
+            total += elapsed
+            self._yielded(r)
+            yield r
+
+
+class AdaptiveThrottleMiddleware(object):
+    """
+    Replace the fixed DOWNLOAD_DELAY with one derived from observed latency.
+
+    Each download slot aims for ADAPTIVE_THROTTLE_TARGET_CONCURRENCY
+    requests in flight: its delay moves halfway towards
+    latency / target on every successful response. A 429, a 5xx or a
+    download error instead multiplies the delay by ADAPTIVE_THROTTLE_BACKOFF
+    (at least a 429's Retry-After). The delay always stays between
+    ADAPTIVE_THROTTLE_MIN_DELAY and ADAPTIVE_THROTTLE_MAX_DELAY.
+    """
+    BACKOFF_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.target = settings.getfloat('ADAPTIVE_THROTTLE_TARGET_CONCURRENCY')
+        self.min_delay = settings.getfloat('ADAPTIVE_THROTTLE_MIN_DELAY')
+        self.max_delay = settings.getfloat('ADAPTIVE_THROTTLE_MAX_DELAY')
+        self.backoff = settings.getfloat('ADAPTIVE_THROTTLE_BACKOFF')
+        self.responses = 0
+        self.latency_total = 0.0
+        self.started = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('ADAPTIVE_THROTTLE_ENABLED'):
+            raise NotConfigured
+        mw = cls(crawler)
+        crawler.signals.connect(mw.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        return mw
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+
+    def _slot(self, request):
+        key = request.meta.get('download_slot')
+        return self.crawler.engine.downloader.slots.get(key)
+
+    def _set_delay(self, slot, delay):
+        slot.delay = min(max(delay, self.min_delay), self.max_delay)
+        self.stats.max_value('adaptive_throttle/max_delay', slot.delay)
+
+    def _back_off(self, slot, at_least=0.0):
+        self.stats.inc_value('adaptive_throttle/backoffs')
+        self._set_delay(slot, max(slot.delay * self.backoff,
+                                  self.min_delay, 0.1, at_least))
+
+    def process_response(self, request, response, spider):
+        latency = request.meta.get('download_latency')
+        slot = self._slot(request)
+        if latency is None or slot is None:
+            # Served from the HTTP cache, or the slot is already gone
+            return response
+        if response.status in self.BACKOFF_STATUS:
+            retry_after = response.headers.get(b'Retry-After', b'')
+            self._back_off(slot, float(retry_after) if retry_after.isdigit() else 0.0)
+            return response
+        self.responses += 1
+        self.latency_total += latency
+        self._set_delay(slot, (slot.delay + latency / self.target) / 2)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        slot = self._slot(request)
+        if slot is not None:
+            self._back_off(slot)
+
+    def spider_closed(self, spider, reason):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        if elapsed:
+            self.stats.set_value('adaptive_throttle/responses_per_sec',
+                                 round(self.responses / elapsed, 3))
+        if self.responses:
+            self.stats.set_value('adaptive_throttle/mean_latency',
+                                 round(self.latency_total / self.responses, 4))
+        delays = [s.delay for s in self.crawler.engine.downloader.slots.values()]
+        if delays:
+            self.stats.set_value('adaptive_throttle/final_delay',
+                                 round(max(delays), 4))
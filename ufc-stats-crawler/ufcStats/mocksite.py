@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# Local stand-in for ufcstats.com.
+#
+# Serves pages recorded by the HTTP cache (run a crawl once with
+# `-s HTTPCACHE_ENABLED=1`) with a configurable per-request latency. It also
+# acts as a plain HTTP proxy, so the spiders can be pointed at it unchanged
+# with `http_proxy=http://127.0.0.1:<port>`:
+#
+#     python -m ufcStats.mocksite --latency 0.2 --port 8765
+#
+# Pages that were never recorded are answered with 404; `--error-rate`
+# answers a random share of requests with 503 to exercise back-off.
+
+import argparse
+import gzip
+import http.server
+import os
+import pickle
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Hop-by-hop and length headers are recomputed for the replayed body
+_SKIP_HEADERS = {b'content-length', b'transfer-encoding', b'connection'}
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return gzip.decompress(data) if data[:2] == b'\x1f\x8b' else data
+
+
+def _key(url):
+    parts = urlsplit(url)
+    return parts.path + (f'?{parts.query}' if parts.query else '')
+
+
+def _headers(raw):
+    headers = []
+    for line in raw.split(b'\r\n'):
+        name, sep, value = line.partition(b':')
+        if sep and name.strip().lower() not in _SKIP_HEADERS:
+            headers.append((name.strip().decode('latin-1'),
+                            value.strip().decode('latin-1')))
+    return headers
+
+
+def load_recordings(cache_dir):
+    """
+    path?query -> (status, headers, body) for every GET response stored by
+    Scrapy's FilesystemCacheStorage under `cache_dir` (all spiders).
+    """
+    pages = {}
+    for root, _, files in os.walk(cache_dir):
+        if 'pickled_meta' not in files or 'response_body' not in files:
+            continue
+        meta = pickle.loads(_read(os.path.join(root, 'pickled_meta')))
+        if meta.get('method', 'GET') != 'GET':
+            continue
+        headers = _read(os.path.join(root, 'response_headers'))
+        pages[_key(meta['url'])] = (int(meta['status']), _headers(headers),
+                                    _read(os.path.join(root, 'response_body')))
+    return pages
+
+
+class MockSite(object):
+    """Threaded HTTP server replaying `pages` after `latency` seconds."""
+    def __init__(self, pages, host='127.0.0.1', port=0, latency=0.0,
+                 jitter=0.0, error_rate=0.0):
+        self.pages = pages
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.server = http.server.ThreadingHTTPServer((host, port),
+                                                      self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _handler(self):
+        site = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                delay = site.latency + random.uniform(0, site.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+                page = site.pages.get(_key(self.path))
+                if site.error_rate and random.random() < site.error_rate:
+                    status, headers, body = 503, [('Retry-After', '1')], b''
+                elif page is None:
+                    status, headers, body = 404, [], b''
+                else:
+                    status, headers, body = page
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve recorded ufcstats.com pages locally')
+    parser.add_argument('--cache-dir', default=os.path.join('.scrapy', 'httpcache'))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='extra random latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='share of requests answered with 503')
+    args = parser.parse_args()
+
+    pages = load_recordings(args.cache_dir)
+    site = MockSite(pages, args.host, args.port, args.latency, args.jitter,
+                    args.error_rate)
+    print(f'Serving {len(pages)} recorded pages on {site.url}')
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        site.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+# Character n-gram inverted index for substring search over short strings
+# (fighter names, stances, ...). Build it once per snapshot; a query only
+# intersects the posting lists of its own n-grams and verifies the few rows
+# that survive, instead of scanning every row.
+
+
+def normalize(text):
+    if not isinstance(text, str):
+        return ''
+    return text.strip().lower()
+
+
+def ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class NgramIndex(object):
+    """
+    Map every n-gram to the sorted row ids whose value contains it.
+
+    `values` are normalized on construction and queries the same way by
+    `search`. Queries shorter than `n` have no n-gram to look up and fall
+    back to a plain scan of the values.
+    """
+    def __init__(self, values, n=3):
+        self.n = n
+        self.values = [normalize(v) for v in values]
+        postings = {}
+        for row, value in enumerate(self.values):
+            for gram in ngrams(value, n):
+                postings.setdefault(gram, []).append(row)
+        self.postings = {gram: tuple(rows) for gram, rows in postings.items()}
+
+    def __len__(self):
+        return len(self.values)
+
+    def search(self, query):
+        """Return the ids of rows containing `query`, in row order."""
+        query = normalize(query)
+        if len(query) < self.n:
+            return [row for row, value in enumerate(self.values)
+                    if query in value]
+
+        lists = []
+        for gram in ngrams(query, self.n):
+            rows = self.postings.get(gram)
+            if rows is None:
+                return []
+            lists.append(rows)
+        lists.sort(key=len)
+
+        candidates = set(lists[0])
+        for rows in lists[1:]:
+            candidates.intersection_update(rows)
+            if not candidates:
+                return []
+        # Sharing every n-gram does not guarantee a contiguous match.
+        return sorted(row for row in candidates if query in self.values[row])
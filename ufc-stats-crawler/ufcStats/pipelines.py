@@ -5,10 +5,27 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+from scrapy.exceptions import DropItem, NotConfigured
 from scrapy.exporters import JsonLinesItemExporter, CsvItemExporter
+import datetime
+import os
 import pathlib
 
-from ufcStats.utils import print_time
+from ufcStats.dedup import KeySet
+from ufcStats.incremental import carried_over, is_incremental, previous_snapshot
+from ufcStats.items import FightsItem, FighterSummaryItem, UpcomingFightsItem
+from ufcStats.jsonlines import SUFFIXES, JsonLinesWriter
+from ufcStats.ngram_index import normalize
+from ufcStats import store, units
+from ufcStats.resume import (finish_partial, interrupted, job_dir,
+                             partial_rows, run_time, take_partial)
+from ufcStats.snapshot import publish
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
 
 fields_fight_info = [
     'fight_id', 'fighter_1', 'fighter_1_id', 'fighter_2', 'fighter_2_id',
@@ -65,6 +82,100 @@ fields_fight_stats = [
 ]
 
 
+# Field that identifies each item class
+DEDUP_KEYS = {
+    FightsItem: 'fight_id',
+    FighterSummaryItem: 'fighter_id',
+    UpcomingFightsItem: 'fight_id',
+}
+
+
+class DedupPipeline(object):
+    """
+    Drop repeated fights, fighters and upcoming bouts within a run.
+
+    Item classes listed in DEDUP_ACROSS_RUNS (e.g. ['FightsItem']) are also
+    dropped when an earlier run already scraped them; their keys are kept
+    in DEDUP_DIR/<ItemClass>.keys. Drops are counted in the crawl stats as
+    dedup/dropped/<ItemClass>.
+
+    With a JOBDIR, the keys seen before an interruption are kept there and
+    still count as seen when the crawl is resumed.
+    """
+    def __init__(self, stats, across_runs=(), directory=None):
+        self.stats = stats
+        self.across_runs = set(across_runs)
+        self.directory = directory
+        self.seen = {}
+        self.persisted = {}
+        self.resumed = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(crawler.stats, settings.getlist('DEDUP_ACROSS_RUNS'),
+                   settings.get('DEDUP_DIR'))
+
+    def open_spider(self, spider):
+        self.seen = {cls: set() for cls in DEDUP_KEYS}
+        self.persisted = {
+            cls: KeySet(os.path.join(self.directory, f'{cls.__name__}.keys'))
+            for cls in DEDUP_KEYS if cls.__name__ in self.across_runs}
+        directory = job_dir(spider)
+        if directory is not None:
+            self.resumed = {
+                cls: KeySet(os.path.join(directory, 'dedup', f'{cls.__name__}.keys'))
+                for cls in DEDUP_KEYS}
+
+    def process_item(self, item, spider):
+        field = DEDUP_KEYS.get(type(item))
+        key = item.get(field) if field else None
+        if key is None:
+            return item
+        name = type(item).__name__
+        seen = (self.seen[type(item)], self.persisted.get(type(item), ()),
+                self.resumed.get(type(item), ()))
+        if any(key in keys for keys in seen):
+            self.stats.inc_value('dedup/dropped')
+            self.stats.inc_value(f'dedup/dropped/{name}')
+            raise DropItem(f'Duplicate {name} {field}={key}')
+        self.seen[type(item)].add(key)
+        return item
+
+    def close_spider(self, spider):
+        for cls, keys in self.resumed.items():
+            for key in self.seen[cls]:
+                keys.add(key)
+            keys.save()
+        if interrupted(spider):
+            # DEDUP_DIR is only updated once the resumed crawl finishes
+            return
+        for cls, keys in self.persisted.items():
+            for key in self.seen[cls]:
+                keys.add(key)
+            if cls in self.resumed:
+                keys.hashes |= self.resumed[cls].hashes
+            keys.save()
+
+
+class FighterNumbersPipeline(object):
+    """
+    Add height_cm, reach_cm, weight_lbs, age (on the crawl date) and a
+    one-hot stance to every FighterSummaryItem; see ufcStats/units.py.
+    """
+    def open_spider(self, spider):
+        self.crawl_date = datetime.date.today()
+
+    def process_item(self, item, spider):
+        if isinstance(item, FighterSummaryItem):
+            item['height_cm'] = units.height_cm(item.get('height'))
+            item['reach_cm'] = units.reach_cm(item.get('reach'))
+            item['weight_lbs'] = units.weight_lbs(item.get('weight'))
+            item['age'] = units.age(item.get('dob'), self.crawl_date)
+            item.update(units.stance_one_hot(item.get('stance')))
+        return item
+
+
 class FightSummaryPipeline(object):
     """
     Save Fight level summary to csv file
@@ -73,23 +184,49 @@ class FightSummaryPipeline(object):
         self.files = {}
 
     def open_spider(self, spider):
-        time_created = print_time('now')
+        time_created = run_time(spider)
         # Create directory
         path_fight_info = f'data/fight_info'
         pathlib.Path(path_fight_info).mkdir(parents=True, exist_ok=True)
         # Write to folder
-        file = open(f'{path_fight_info}/{time_created}.csv', 'wb')
+        # Written aside and renamed into place by close_spider
+        self.path = f'{path_fight_info}/{time_created}.csv'
+        self.fight_ids = set()
+        resumed = take_partial(f'{self.path}.part')
+        file = open(f'{self.path}.part', 'wb')
         self.files[spider] = file
         self.exporter = CsvItemExporter(file)
         self.exporter.fields_to_export = fields_fight_info
         self.exporter.start_exporting()
+        self.resumed_ids = set()
+        if resumed is not None:
+            # Rows written before the crawl was interrupted
+            for row in partial_rows(resumed, self.path):
+                self.process_item(row, spider)
+            finish_partial(resumed)
+            self.resumed_ids = set(self.fight_ids)
 
     def close_spider(self, spider):
+        resuming = interrupted(spider)
+        if is_incremental(spider) and not resuming:
+            # Keep the fights this run did not re-scrape
+            for row in carried_over('data/fight_info', '.csv', self.path,
+                                    lambda r: r.get('fight_id'), self.fight_ids):
+                self.exporter.export_item(row)
         self.exporter.finish_exporting()
         file = self.files.pop(spider)
         file.close()
+        if resuming:
+            # Left as .part for the run that resumes this JOBDIR
+            return
+        publish(f'{self.path}.part', self.path,
+                latest='data/fight_info/latest.csv')
 
     def process_item(self, item, spider):
+        if item.get('fight_id') in self.resumed_ids:
+            # Re-scraped after a crash; the earlier row is kept
+            return item
+        self.fight_ids.add(item.get('fight_id'))
         self.exporter.export_item(item)
         return item
 
@@ -97,27 +234,345 @@ class FightSummaryPipeline(object):
 class FightStatsPipeline(object):
     """
     Save Fight stats to jl file
+
+    With FIGHT_STATS_COMPRESSION set to 'gzip' or 'zstd', rows are buffered
+    (FIGHT_STATS_BATCH_SIZE), encoded with orjson and written compressed to
+    .jl.gz / .jl.zst, flushed at least every FIGHT_STATS_FLUSH_SECONDS.
     """
     def __init__(self):
         self.files = {}
+        self.writer = None
 
     def open_spider(self, spider):
-        time_created = print_time('now')
+        settings = spider.settings
+        compression = settings.get('FIGHT_STATS_COMPRESSION') or None
+        time_created = run_time(spider)
         # Create directory
         path_fight_stats = f'data/fight_stats'
         pathlib.Path(path_fight_stats).mkdir(parents=True, exist_ok=True)
         # Write to folder
-        file = open(f'{path_fight_stats}/{time_created}.jl', 'wb')
-        self.files[spider] = file
-        self.exporter = JsonLinesItemExporter(file)
-        self.exporter.fields_to_export = fields_fight_stats
+        self.path = f'{path_fight_stats}/{time_created}{SUFFIXES[compression]}'
+        self.fight_ids = set()
+        self.rows = 0
+        resumed = take_partial(f'{self.path}.part')
+        if compression is not None:
+            self.writer = JsonLinesWriter(
+                f'{self.path}.part', compression,
+                batch_size=settings.getint('FIGHT_STATS_BATCH_SIZE', 500),
+                flush_seconds=settings.getfloat('FIGHT_STATS_FLUSH_SECONDS', 30))
+        else:
+            file = open(f'{self.path}.part', 'wb')
+            self.files[spider] = file
+            self.exporter = JsonLinesItemExporter(file)
+            self.exporter.fields_to_export = fields_fight_stats
+            self.exporter.start_exporting()
+        self.resumed_ids = set()
+        if resumed is not None:
+            # Rows written before the crawl was interrupted
+            for row in partial_rows(resumed, self.path):
+                self.process_item(row, spider)
+            finish_partial(resumed)
+            self.resumed_ids = set(self.fight_ids)
+
+    def _export(self, row):
+        self.rows += 1
+        if self.writer is None:
+            self.exporter.export_item(row)
+        else:
+            # Same fields as the exporter: only those set on the item
+            self.writer.write({f: row[f] for f in fields_fight_stats if f in row})
+
+    def close_spider(self, spider):
+        resuming = interrupted(spider)
+        if is_incremental(spider) and not resuming:
+            for row in carried_over('data/fight_stats', tuple(SUFFIXES.values()),
+                                    self.path, lambda r: r.get('fight_id'),
+                                    self.fight_ids):
+                self._export(row)
+        if self.writer is not None:
+            self.writer.close()
+        else:
+            self.exporter.finish_exporting()
+            file = self.files.pop(spider)
+            file.close()
+        if resuming:
+            return
+        publish(f'{self.path}.part', self.path, rows=self.rows,
+                columns=fields_fight_stats)
+
+    def process_item(self, item, spider):
+        if item.get('fight_id') in self.resumed_ids:
+            return item
+        self.fight_ids.add(item.get('fight_id'))
+        self._export(item)
+        return item
+
+
+class FighterSummaryPipeline(object):
+    """
+    Save the fighter table to csv on incremental runs (merged with the
+    previous snapshot) and on resumable runs (with a JOBDIR). Other full
+    runs can keep using a feed export.
+    """
+    def open_spider(self, spider):
+        self.enabled = is_incremental(spider) or job_dir(spider) is not None
+        if not self.enabled:
+            return
+        time_created = run_time(spider)
+        path_fighter_stats = f'data/fighter_stats'
+        pathlib.Path(path_fighter_stats).mkdir(parents=True, exist_ok=True)
+        self.path = f'{path_fighter_stats}/{time_created}.csv'
+        self.fighter_ids = set()
+        resumed = take_partial(f'{self.path}.part')
+        self.file = open(f'{self.path}.part', 'wb')
+        self.exporter = CsvItemExporter(self.file)
+        self.exporter.fields_to_export = list(FighterSummaryItem.fields)
         self.exporter.start_exporting()
+        if resumed is not None:
+            # Rows written before the crawl was interrupted
+            for row in partial_rows(resumed, self.path):
+                self.fighter_ids.add(row.get('fighter_id'))
+                self.exporter.export_item(row)
+            finish_partial(resumed)
+        self.resumed_ids = set(self.fighter_ids)
 
     def close_spider(self, spider):
+        if not self.enabled:
+            return
+        resuming = interrupted(spider)
+        if is_incremental(spider) and not resuming:
+            for row in carried_over('data/fighter_stats', '.csv', self.path,
+                                    lambda r: r.get('fighter_id'), self.fighter_ids):
+                self.exporter.export_item(row)
         self.exporter.finish_exporting()
-        file = self.files.pop(spider)
-        file.close()
+        self.file.close()
+        if resuming:
+            return
+        publish(f'{self.path}.part', self.path,
+                latest='data/fighter_stats/latest.csv')
 
     def process_item(self, item, spider):
-        self.exporter.export_item(item)
+        if (self.enabled and isinstance(item, FighterSummaryItem)
+                and item.get('fighter_id') not in self.resumed_ids):
+            self.fighter_ids.add(item.get('fighter_id'))
+            self.exporter.export_item(item)
         return item
+
+
+def _arrow_column(values):
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed types (e.g. '--' next to numbers): keep the raw text
+        return pa.array([None if v is None else str(v) for v in values],
+                        type=pa.string())
+
+
+def _fight_stats_rows(item):
+    """One row per fighter: the per-fight list fields are exploded."""
+    lists = {f: item.get(f) for f in fields_fight_stats if f != 'fight_id'}
+    n = max((len(v) for v in lists.values() if isinstance(v, list)),
+            default=0)
+    for i in range(n):
+        row = {'fight_id': item.get('fight_id')}
+        for field, value in lists.items():
+            if isinstance(value, list):
+                row[field] = value[i] if i < len(value) else None
+            else:
+                row[field] = value
+        yield row
+
+
+def write_arrow_snapshot(table, rows, time_created):
+    """Publish `rows` as data/<table>/<time_created>.arrow (and latest.arrow)."""
+    path = f'data/{table}'
+    columns = list(rows[0].keys())
+    arrow_table = pa.table(
+        {c: _arrow_column([r.get(c) for r in rows]) for c in columns})
+    pathlib.Path(path).mkdir(parents=True, exist_ok=True)
+    out = f'{path}/{time_created}.arrow'
+    feather.write_feather(arrow_table, f'{out}.part', compression='uncompressed')
+    publish(f'{out}.part', out, rows=len(rows), columns=columns,
+            latest=f'{path}/latest.arrow')
+    return out
+
+
+# Row key per table when an incremental run is merged into the last snapshot
+SNAPSHOT_KEYS = {
+    'fight_info': 'fight_id',
+    'fight_stats': 'fight_id',
+    'fighter_stats': 'fighter_id',
+}
+
+
+# Table with one row per item, keyed by the item's DEDUP_KEYS field
+ITEM_TABLES = {
+    FightsItem: 'fight_info',
+    FighterSummaryItem: 'fighter_stats',
+    UpcomingFightsItem: 'upcoming',
+}
+
+
+class ArrowSnapshotPipeline(object):
+    """
+    Save a typed columnar snapshot (Arrow IPC / Feather v2) of every table
+    the spider produces, next to the CSV/JL output.
+
+    Files are written uncompressed so readers can memory-map them and load
+    only the columns they need without copying. Each run publishes
+    data/<table>/<time>.arrow (recorded in data/<table>/manifest.json) and
+    refreshes data/<table>/latest.arrow.
+    Incremental runs carry over the rows of the previous snapshot that were
+    not re-scraped. With a JOBDIR the rows are also spooled to
+    JOBDIR/arrow_rows.jl, so a resumed crawl still snapshots every row.
+    """
+    def __init__(self):
+        self.rows = {}
+        self.spool = None
+        self.resumed_ids = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if pa is None:
+            raise NotConfigured('pyarrow is not installed')
+        if not crawler.settings.getbool('ARROW_SNAPSHOT_ENABLED', True):
+            raise NotConfigured('ARROW_SNAPSHOT_ENABLED is off')
+        return cls()
+
+    def open_spider(self, spider):
+        self.time_created = run_time(spider)
+        self.rows = {}
+        directory = job_dir(spider)
+        if directory is None:
+            return
+        path = os.path.join(directory, 'arrow_rows.jl')
+        resumed = take_partial(path)
+        self.spool = JsonLinesWriter(path)
+        if resumed is not None:
+            for entry in partial_rows(resumed, path):
+                self._add(entry['table'], entry['row'])
+            finish_partial(resumed)
+            self.resumed_ids = {
+                table: {r.get(DEDUP_KEYS[cls]) for r in self.rows.get(table, [])}
+                for cls, table in ITEM_TABLES.items()}
+
+    def _add(self, table, row):
+        self.rows.setdefault(table, []).append(row)
+        if self.spool is not None:
+            self.spool.write({'table': table, 'row': row})
+
+    def process_item(self, item, spider):
+        field = DEDUP_KEYS.get(type(item))
+        if field and item.get(field) in self.resumed_ids.get(ITEM_TABLES[type(item)], ()):
+            # Re-scraped after a crash; the spooled rows are kept
+            return item
+        if isinstance(item, FightsItem):
+            self._add('fight_info', {f: item.get(f) for f in fields_fight_info})
+            for row in _fight_stats_rows(item):
+                self._add('fight_stats', row)
+        elif isinstance(item, FighterSummaryItem):
+            self._add('fighter_stats', {f: item.get(f) for f in item.fields})
+        elif isinstance(item, UpcomingFightsItem):
+            self._add('upcoming', {f: item.get(f) for f in item.fields})
+        return item
+
+    def _carried_over(self, table, rows, path):
+        key = SNAPSHOT_KEYS.get(table)
+        previous = previous_snapshot(path, '.arrow')
+        if key is None or previous is None:
+            return []
+        seen = {r.get(key) for r in rows}
+        return [r for r in feather.read_table(previous).to_pylist()
+                if r.get(key) not in seen]
+
+    def close_spider(self, spider):
+        if self.spool is not None:
+            self.spool.close()
+        if interrupted(spider):
+            return
+        incremental = is_incremental(spider)
+        for table, rows in self.rows.items():
+            if not rows:
+                continue
+            path = f'data/{table}'
+            if incremental:
+                rows = rows + self._carried_over(table, rows, path)
+            out = write_arrow_snapshot(table, rows, self.time_created)
+            spider.logger.info('Arrow snapshot %s: %d rows', out, len(rows))
+
+
+# Tables written by SqlitePipeline
+SQLITE_TABLES = {
+    'fights': store.Table(
+        'fights', ('fight_id',), fields_fight_info,
+        (('fighter_1_id',), ('fighter_2_id',), ('date',))),
+    'fight_stats': store.Table(
+        'fight_stats', ('fight_id', 'fighter_id'), fields_fight_stats,
+        (('fighter_id',),)),
+    'fighters': store.Table(
+        'fighters', ('fighter_id',),
+        list(FighterSummaryItem.fields) + ['name_norm'], (('name_norm',),)),
+    'upcoming': store.Table(
+        'upcoming', ('fight_id',), list(UpcomingFightsItem.fields),
+        (('fighter_1_id',), ('fighter_2_id',), ('date',))),
+}
+
+
+class SqlitePipeline(object):
+    """
+    Upsert fights, fight stats, fighters and upcoming bouts into SQLite
+    (SQLITE_PATH). Rows are buffered and committed SQLITE_BATCH_SIZE items
+    per transaction.
+    """
+    def __init__(self, path, batch_size):
+        self.path = path
+        self.batch_size = batch_size
+        self.conn = None
+        self.rows = {}
+        self.pending = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('SQLITE_ENABLED'):
+            raise NotConfigured('SQLITE_ENABLED is off')
+        return cls(settings.get('SQLITE_PATH'),
+                   settings.getint('SQLITE_BATCH_SIZE', 500))
+
+    def open_spider(self, spider):
+        self.conn = store.connect(self.path)
+        with self.conn:
+            for table in SQLITE_TABLES.values():
+                store.ensure_table(self.conn, table)
+
+    def _add(self, table, row):
+        self.rows.setdefault(table, []).append(row)
+
+    def process_item(self, item, spider):
+        if isinstance(item, FightsItem):
+            self._add('fights', item)
+            for row in _fight_stats_rows(item):
+                self._add('fight_stats', row)
+        elif isinstance(item, FighterSummaryItem):
+            row = dict(item)
+            row['name_norm'] = normalize(row.get('name') or '')
+            self._add('fighters', row)
+        elif isinstance(item, UpcomingFightsItem):
+            self._add('upcoming', item)
+        else:
+            return item
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self._commit()
+        return item
+
+    def _commit(self):
+        with self.conn:
+            for table, rows in self.rows.items():
+                store.upsert(self.conn, SQLITE_TABLES[table], rows)
+        self.rows = {}
+        self.pending = 0
+
+    def close_spider(self, spider):
+        self._commit()
+        self.conn.close()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+# Checkpoint and resume for long crawls.
+#
+# Start a crawl with a job directory:
+#
+#     scrapy crawl ufcFights -s JOBDIR=data/jobs/ufcFights
+#
+# Scrapy persists the scheduler queue and the seen-request fingerprints in
+# JOBDIR. On top of that every run records its timestamp in JOBDIR/run.json,
+# so after an interruption (Ctrl-C, SIGTERM, a crash) running the same
+# command again reopens the same data/<table>/<time>.* outputs: the rows
+# already in the .part files are kept and new rows are appended after them.
+# Outputs are only published (and JOBDIR removed) once the crawl finishes.
+
+import csv
+import io
+import json
+import os
+import shutil
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from ufcStats.jsonlines import TRUNCATED_ERRORS, iter_jsonlines
+from ufcStats.utils import print_time
+
+RUN_FILE = 'run.json'
+
+
+def job_dir(spider):
+    return spider.settings.get('JOBDIR') or None
+
+
+def run_time(spider):
+    """
+    Timestamp naming this run's output files. Resumed runs get the one of
+    the interrupted run, so they keep writing the same output set.
+    """
+    directory = job_dir(spider)
+    if directory is None:
+        return print_time('now')
+    path = os.path.join(directory, RUN_FILE)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)['time_created']
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    time_created = print_time('now')
+    os.makedirs(directory, exist_ok=True)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'spider': spider.name, 'time_created': time_created}, f)
+    os.replace(f'{path}.tmp', path)
+    return time_created
+
+
+def interrupted(spider):
+    """
+    True when a JOBDIR crawl is closing before it ran out of requests;
+    its outputs then stay .part files for the resumed run.
+    """
+    if job_dir(spider) is None:
+        return False
+    crawler = spider.crawler
+    # crawler.stop() (Ctrl-C / SIGTERM) clears `crawling` before closing
+    return not (crawler.crawling and crawler.engine.spider_is_idle())
+
+
+def take_partial(part):
+    """
+    Move the partial output `part` of an interrupted run aside and return
+    its new path (None if there is none), so `part` can be rewritten.
+    """
+    resumed = f'{part}.resume'
+    if os.path.exists(resumed):
+        # The previous resume stopped while copying; this is the full copy
+        return resumed
+    if not os.path.exists(part):
+        return None
+    os.replace(part, resumed)
+    return resumed
+
+
+def _complete_lines(path):
+    """Text of `path` up to its last newline; a crash can cut the last row."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data[:data.rfind(b'\n') + 1].decode('utf-8')
+
+
+def partial_rows(resumed, name):
+    """
+    The complete rows (dicts) of a partial output moved aside by
+    take_partial(). `name` is the file name it will be published under,
+    which gives the format (.csv, .jl, .jl.gz, .jl.zst, .jl for a spool).
+    """
+    if name.endswith('.csv'):
+        return list(csv.DictReader(io.StringIO(_complete_lines(resumed),
+                                               newline='')))
+    if name.endswith('.jl'):
+        return [json.loads(line)
+                for line in _complete_lines(resumed).splitlines() if line.strip()]
+    rows = []
+    try:
+        for row in iter_jsonlines(resumed, name=name):
+            rows.append(row)
+    except TRUNCATED_ERRORS:
+        # Keep what decoded cleanly before the cut
+        pass
+    return rows
+
+
+def finish_partial(resumed):
+    if resumed is not None:
+        os.remove(resumed)
+
+
+class JobDirCleanup(object):
+    """
+    Remove JOBDIR once a crawl has finished, so the next run with the same
+    setting starts from scratch instead of finding every request seen.
+    Interrupted crawls keep it for resuming.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.finished = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        directory = crawler.settings.get('JOBDIR')
+        if not directory:
+            raise NotConfigured
+        ext = cls(directory)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.engine_stopped, signal=signals.engine_stopped)
+        return ext
+
+    def spider_closed(self, spider, reason):
+        self.finished = reason == 'finished'
+        if not self.finished:
+            spider.logger.info('Crawl state kept in %s; run the same command '
+                               'again to resume', self.directory)
+
+    def engine_stopped(self):
+        # After spider_closed, when the scheduler and SpiderState have saved
+        if self.finished and os.path.exists(os.path.join(self.directory,
+                                                         'requests.seen')):
+            shutil.rmtree(self.directory, ignore_errors=True)
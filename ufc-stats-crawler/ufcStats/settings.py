@@ -48,27 +48,105 @@ COOKIES_ENABLED = False
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    'ufcStats.middlewares.UfcstatsSpiderMiddleware': 543,
-#}
+SPIDER_MIDDLEWARES = {
+    'ufcStats.incremental.IncrementalMiddleware': 543,
+    'ufcStats.shard.ShardMiddleware': 545,
+    'ufcStats.middlewares.CallbackTimingMiddleware': 950,
+}
+
+# Time every spider callback into the crawl stats (used by the benchmarks;
+# also on while CRAWL_PROFILE_ENABLED)
+CALLBACK_TIMING_ENABLED = False
+
+# Incremental crawls (`-a incremental=1`) skip events, fights and fighters
+# recorded in CRAWL_STATE_FILE and merge new rows into the last snapshot
+INCREMENTAL_CRAWL = False
+CRAWL_STATE_FILE = 'data/crawl_state.json'
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    'ufcStats.middlewares.UfcstatsDownloaderMiddleware': 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    'scrapy.downloadermiddlewares.httpcache.HttpCacheMiddleware': None,
+    'ufcStats.httpcache.CacheMiddleware': 900,
+    'ufcStats.middlewares.AdaptiveThrottleMiddleware': 950,
+    'ufcStats.shard.SharedBudgetMiddleware': 960,
+}
+
+# Adaptive throttling (`-s ADAPTIVE_THROTTLE_ENABLED=1`): instead of the fixed
+# DOWNLOAD_DELAY, keep about TARGET_CONCURRENCY requests in flight per slot
+# based on observed latency, and back off on errors, 429 and 5xx responses.
+# The target is capped by CONCURRENT_REQUESTS_PER_DOMAIN.
+ADAPTIVE_THROTTLE_ENABLED = False
+ADAPTIVE_THROTTLE_TARGET_CONCURRENCY = 4.0
+ADAPTIVE_THROTTLE_MIN_DELAY = 0.0
+ADAPTIVE_THROTTLE_MAX_DELAY = 30.0
+ADAPTIVE_THROTTLE_BACKOFF = 2.0
+
+# Sharded crawls (python -m ufcStats.shard): this worker follows the events
+# of shard SHARD_INDEX of SHARD_COUNT, and all workers sharing
+# SHARD_BUDGET_FILE send at most SHARD_BUDGET_RPS requests per second in total
+SHARD_COUNT = 1
+SHARD_INDEX = 0
+SHARD_BUDGET_FILE = None
+SHARD_BUDGET_RPS = 2.0
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    'scrapy.extensions.telnet.TelnetConsole': None,
-#}
+EXTENSIONS = {
+    'ufcStats.extensions.StatsFile': 500,
+    'ufcStats.resume.JobDirCleanup': 510,
+    'ufcStats.extensions.CrawlProfile': 520,
+}
+
+# Latency/size percentiles, parse and pipeline time and items/sec over time,
+# written to log/<time>.profile.json (or CRAWL_PROFILE_FILE) after each crawl
+CRAWL_PROFILE_ENABLED = True
+CRAWL_PROFILE_FILE = None
+CRAWL_PROFILE_INTERVAL = 10
+
+# Write the final crawl stats as JSON to this path when set
+STATS_FILE = None
+
+# Resumable crawls: pass -s JOBDIR=data/jobs/<spider> to keep the scheduler
+# queue, seen requests and partial outputs there (see ufcStats/resume.py)
+JOBDIR = None
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    'ufcStats.pipelines.UfcstatsPipeline': 300,
-#}
+#
+# Pipelines every spider needs go in ITEM_PIPELINES_BASE: Scrapy merges it
+# with ITEM_PIPELINES, and a spider's custom_settings only replace the
+# latter (ufcFights sets its own FightSummary/FightStats pipelines)
+ITEM_PIPELINES_BASE = {
+    'ufcStats.pipelines.DedupPipeline': 100,
+    'ufcStats.pipelines.SqlitePipeline': 700,
+    'ufcStats.pipelines.ArrowSnapshotPipeline': 800,
+}
+ITEM_PIPELINES = {
+    'ufcStats.pipelines.FighterNumbersPipeline': 200,
+    'ufcStats.pipelines.FighterSummaryPipeline': 300,
+}
+
+# Also write a typed columnar snapshot (data/<table>/*.arrow) of each run;
+# needs pyarrow, skipped otherwise
+ARROW_SNAPSHOT_ENABLED = True
+
+# DedupPipeline drops repeated fight_id / fighter_id within a run; item
+# classes listed here (e.g. ['FightsItem']) are also dropped when a previous
+# run already scraped them. Keys are kept as 64-bit hashes in DEDUP_DIR.
+DEDUP_ACROSS_RUNS = []
+DEDUP_DIR = 'data/dedup'
+
+# FightStatsPipeline output: None for plain .jl, or 'gzip' / 'zstd' for a
+# buffered, compressed .jl.gz / .jl.zst (zstd needs the zstandard package)
+FIGHT_STATS_COMPRESSION = None
+FIGHT_STATS_BATCH_SIZE = 500
+FIGHT_STATS_FLUSH_SECONDS = 30
+
+# Upsert every item into one SQLite database as well (queried by the API)
+SQLITE_ENABLED = True
+SQLITE_PATH = 'data/ufcstats.db'
+SQLITE_BATCH_SIZE = 500
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -85,11 +163,19 @@ COOKIES_ENABLED = False
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = 'httpcache'
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+#
+# `-s HTTPCACHE_ENABLED=1` caches responses under .scrapy/httpcache; fight
+# pages never expire, other pages after HTTPCACHE_PAGE_EXPIRATION_SECS.
+# `-s HTTPCACHE_REPLAY=1` serves only from the cache (offline re-parse).
+HTTPCACHE_ENABLED = False
+HTTPCACHE_REPLAY = False
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_PAGE_EXPIRATION_SECS = 24 * 3600
+HTTPCACHE_DIR = 'httpcache'
+HTTPCACHE_IGNORE_HTTP_CODES = [429, 500, 502, 503, 504]
+HTTPCACHE_POLICY = 'ufcStats.httpcache.UfcStatsCachePolicy'
+HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+HTTPCACHE_GZIP = True
 
 log_time = print_time('now')
 path_log = "log"
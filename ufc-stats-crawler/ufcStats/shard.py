@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+
+# Sharded full crawl of the fight history.
+#
+#     python -m ufcStats.shard --shards 4 --rps 4
+#
+# runs N `scrapy crawl ufcFights` worker processes. Each worker only follows
+# the events whose id hashes to its shard (ShardMiddleware), and all of them
+# draw from one shared request budget of --rps requests per second
+# (SharedBudgetMiddleware, a token bucket in a locked file) instead of each
+# applying DOWNLOAD_DELAY on its own. Workers write their outputs into
+# data/shards/<time>/shard-<i>/; once all have finished the fight_info CSVs
+# and fight_stats JL files are merged, deduplicated by fight_id, and
+# published as one snapshot (plus Arrow and SQLite when enabled), and the
+# shards' crawl state is folded into CRAWL_STATE_FILE.
+
+import argparse
+import csv
+import fcntl
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from scrapy import Request
+from scrapy.exceptions import NotConfigured
+from twisted.internet import reactor
+from twisted.internet.task import deferLater
+
+from ufcStats.dedup import key_hash
+from ufcStats.incremental import CrawlState, detail_id, read_rows
+from ufcStats.jsonlines import SUFFIXES, JsonLinesWriter
+from ufcStats.utils import print_time
+
+SPIDER = 'ufcFights'
+
+
+def shard_of(key, count):
+    return key_hash(key) % count
+
+
+class ShardMiddleware(object):
+    """
+    Spider middleware that drops event-details requests belonging to other
+    shards (SHARD_INDEX of SHARD_COUNT). Fights are only reached through
+    their event, so they are partitioned along with it.
+    """
+    def __init__(self, index, count, stats):
+        self.index = index
+        self.count = count
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        count = crawler.settings.getint('SHARD_COUNT', 1)
+        if count <= 1:
+            raise NotConfigured
+        return cls(crawler.settings.getint('SHARD_INDEX'), count, crawler.stats)
+
+    def _keep(self, r):
+        if isinstance(r, Request):
+            kind, ident = detail_id(r.url)
+            if kind == 'event' and shard_of(ident, self.count) != self.index:
+                self.stats.inc_value('shard/skipped_events')
+                return False
+        return True
+
+    def process_start_requests(self, start_requests, spider):
+        for r in start_requests:
+            if self._keep(r):
+                yield r
+
+    def process_spider_output(self, response, result, spider):
+        for r in result:
+            if self._keep(r):
+                yield r
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for r in result:
+            if self._keep(r):
+                yield r
+
+
+class SharedBudgetMiddleware(object):
+    """
+    Downloader middleware that lets all processes sharing SHARD_BUDGET_FILE
+    send at most SHARD_BUDGET_RPS requests per second in total. Each request
+    reserves the next free send time in the file (under an exclusive lock)
+    and is held back until then without blocking the reactor.
+    """
+    def __init__(self, path, rps, stats):
+        self.path = path
+        self.interval = 1.0 / rps
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        path = settings.get('SHARD_BUDGET_FILE')
+        if not path:
+            raise NotConfigured
+        return cls(path, settings.getfloat('SHARD_BUDGET_RPS', 2.0), crawler.stats)
+
+    def _reserve(self):
+        """Seconds to wait before sending the next request."""
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            raw = f.read().strip()
+            now = time.time()
+            slot = max(now, float(raw) if raw else 0.0)
+            f.seek(0)
+            f.truncate()
+            f.write(repr(slot + self.interval))
+        return slot - now
+
+    def process_request(self, request, spider):
+        wait = self._reserve()
+        if wait <= 0:
+            return None
+        self.stats.inc_value('shard/budget_wait_seconds', wait)
+        return deferLater(reactor, wait, lambda: None)
+
+
+def _first_per_fight(paths):
+    """Rows of every shard file, keeping the first row of each fight_id."""
+    seen = set()
+    for path in paths:
+        for row in read_rows(path):
+            if row.get('fight_id') not in seen:
+                seen.add(row.get('fight_id'))
+                yield row
+
+
+def _first_per_fight_arrow(paths, feather):
+    """
+    Rows of every shard Arrow snapshot, each fight_id taken from the first
+    file that has it (all of its rows, as fight_stats has one per fighter).
+    """
+    seen = set()
+    for path in paths:
+        rows = feather.read_table(path).to_pylist()
+        yield from (r for r in rows if r.get('fight_id') not in seen)
+        seen.update(r.get('fight_id') for r in rows)
+
+
+def merge_shards(shard_dirs, settings, time_created=None):
+    """
+    Merge the fight_info / fight_stats outputs of `shard_dirs` into one
+    deduplicated, published snapshot under data/. Returns rows per table.
+    """
+    # Needs the item and pipeline definitions, which import Scrapy
+    from ufcStats import pipelines, store
+    from ufcStats.snapshot import publish
+
+    time_created = time_created or print_time('now')
+    counts = {}
+
+    info_files = sorted(f for d in shard_dirs
+                        for f in glob.glob(os.path.join(d, 'data', 'fight_info', '2*.csv')))
+    fight_info = list(_first_per_fight(info_files))
+    os.makedirs('data/fight_info', exist_ok=True)
+    path = f'data/fight_info/{time_created}.csv'
+    with open(f'{path}.part', 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, pipelines.fields_fight_info, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(fight_info)
+    publish(f'{path}.part', path, latest='data/fight_info/latest.csv')
+    counts['fight_info'] = len(fight_info)
+
+    stats_files = sorted(f for d in shard_dirs
+                         for f in glob.glob(os.path.join(d, 'data', 'fight_stats', '2*.jl*'))
+                         if not f.endswith('.part'))
+    compression = settings.get('FIGHT_STATS_COMPRESSION') or None
+    fight_stats = list(_first_per_fight(stats_files))
+    os.makedirs('data/fight_stats', exist_ok=True)
+    path = f'data/fight_stats/{time_created}{SUFFIXES[compression]}'
+    writer = JsonLinesWriter(f'{path}.part', compression,
+                             batch_size=settings.getint('FIGHT_STATS_BATCH_SIZE', 500))
+    for row in fight_stats:
+        writer.write({f: row[f] for f in pipelines.fields_fight_stats if f in row})
+    writer.close()
+    publish(f'{path}.part', path, rows=len(fight_stats),
+            columns=pipelines.fields_fight_stats)
+    counts['fight_stats'] = len(fight_stats)
+
+    exploded = [r for row in fight_stats for r in pipelines._fight_stats_rows(row)]
+    if pipelines.pa is not None and settings.getbool('ARROW_SNAPSHOT_ENABLED', True):
+        # From the workers' own Arrow snapshots, not the CSV / JL rows read
+        # back as text, so the merged file keeps the pipeline's types
+        for table in ('fight_info', 'fight_stats'):
+            files = sorted(f for d in shard_dirs
+                           for f in glob.glob(os.path.join(d, 'data', table, '2*.arrow')))
+            rows = list(_first_per_fight_arrow(files, pipelines.feather))
+            if rows:
+                pipelines.write_arrow_snapshot(table, rows, time_created)
+
+    if settings.getbool('SQLITE_ENABLED'):
+        conn = store.connect(settings.get('SQLITE_PATH'))
+        with conn:
+            for name, rows in (('fights', fight_info), ('fight_stats', exploded)):
+                table = pipelines.SQLITE_TABLES[name]
+                store.ensure_table(conn, table)
+                store.upsert(conn, table, rows)
+        conn.close()
+
+    state = CrawlState(settings.get('CRAWL_STATE_FILE'))
+    for d in shard_dirs:
+        shard_state = CrawlState(os.path.join(d, 'data', 'crawl_state.json'))
+        for field in CrawlState.FIELDS:
+            getattr(state, field).update(getattr(shard_state, field))
+    state.save()
+    return counts
+
+
+def run_shards(shards, rps, overrides=(), keep=False):
+    """Crawl with `shards` worker processes, then merge. Returns exit code."""
+    from scrapy.utils.conf import init_env
+    from scrapy.utils.project import get_project_settings
+
+    init_env()
+    settings = get_project_settings()
+    for override in overrides:
+        name, _, value = override.partition('=')
+        settings.set(name, value, priority='cmdline')
+
+    time_created = print_time('now')
+    root = os.path.abspath(os.path.join('data', 'shards', time_created))
+    log_dir = os.path.abspath('log')
+    os.makedirs(root, exist_ok=True)
+    os.makedirs(log_dir, exist_ok=True)
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join(
+                   p for p in (os.getcwd(), os.environ.get('PYTHONPATH')) if p))
+
+    procs = []
+    shard_dirs = []
+    for index in range(shards):
+        workdir = os.path.join(root, f'shard-{index}')
+        os.makedirs(workdir)
+        shard_dirs.append(workdir)
+        cmd = [sys.executable, '-m', 'scrapy', 'crawl', SPIDER,
+               '-s', f'SHARD_INDEX={index}',
+               '-s', f'SHARD_COUNT={shards}',
+               '-s', f"SHARD_BUDGET_FILE={os.path.join(root, 'budget')}",
+               '-s', f'SHARD_BUDGET_RPS={rps}',
+               # The shared budget replaces the per-process delay
+               '-s', 'DOWNLOAD_DELAY=0',
+               # Written once, by the merge (which builds its Arrow
+               # snapshots from the workers' typed ones)
+               '-s', 'SQLITE_ENABLED=0',
+               '-s', f"LOG_FILE={os.path.join(log_dir, f'{time_created}-shard{index}.log')}"]
+        for override in overrides:
+            cmd += ['-s', override]
+        procs.append(subprocess.Popen(cmd, cwd=workdir, env=env))
+
+    failed = [i for i, proc in enumerate(procs) if proc.wait() != 0]
+    if failed:
+        print(f'Shards {failed} failed; outputs kept in {root}', file=sys.stderr)
+        return 1
+    counts = merge_shards(shard_dirs, settings, time_created)
+    print(f"Merged {shards} shards: {counts['fight_info']} fights, "
+          f"{counts['fight_stats']} fight stats rows")
+    if not keep:
+        shutil.rmtree(root)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=f'Crawl {SPIDER} in parallel shards and merge the output')
+    parser.add_argument('--shards', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--rps', type=float, default=2.0,
+                        help='requests per second across all shards')
+    parser.add_argument('-s', dest='overrides', action='append', default=[],
+                        metavar='NAME=VALUE', help='extra Scrapy setting')
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the per-shard outputs after merging')
+    args = parser.parse_args()
+    sys.exit(run_shards(args.shards, args.rps, args.overrides, args.keep))
+
+
+if __name__ == '__main__':
+    main()
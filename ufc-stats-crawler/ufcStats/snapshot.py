@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+
+# Snapshot-versioned in-memory tables for the stats APIs.
+#
+# Every crawl publishes a new file under data/<table>/. Readers keep one
+# parsed copy of the newest file in memory, keyed by its snapshot version
+# (path, mtime and size), and only re-parse when a new snapshot lands.
+#
+# Files are published atomically (written aside, then renamed into place)
+# and recorded in data/<table>/manifest.json, one entry per format:
+#
+#     {"csv": {"path": "<time>.csv", "rows": 4440, "schema_version": 1,
+#              "sha256": "...", "published_at": "...", "columns": [...]}}
+#
+# so readers find the current snapshot with one small read instead of
+# globbing the directory. Older trees without a manifest fall back to the
+# newest file by mtime.
+
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+SNAPSHOT_POLL_SECONDS = float(os.environ.get('SNAPSHOT_POLL_SECONDS', '2'))
+
+MANIFEST = 'manifest.json'
+# Bump when the columns of a published table change incompatibly
+SCHEMA_VERSION = 1
+
+SnapshotVersion = namedtuple('SnapshotVersion', ['path', 'mtime_ns', 'size'])
+Snapshot = namedtuple('Snapshot', ['version', 'value'])
+
+
+def etag(version, *parts):
+    """
+    Quoted entity tag for a response built from snapshot `version` and
+    `parts`; callers that serve several encodings of it send it weak (W/).
+    """
+    digest = hashlib.sha1(repr((tuple(version),) + parts).encode('utf-8'))
+    return f'"{digest.hexdigest()[:24]}"'
+
+
+def etag_matches(if_none_match, tag):
+    """True if an If-None-Match header value covers `tag`."""
+    if not if_none_match:
+        return False
+    # Weak comparison, as If-None-Match uses
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == tag:
+            return True
+    return False
+
+
+def _format(path):
+    """'csv', 'arrow', 'jl.gz', ... from a '<time>.<format>' file name."""
+    return os.path.basename(path).split('.', 1)[-1]
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _manifest_file(pattern):
+    """The published file for a 'dir/*.<format>' pattern, if recorded."""
+    directory, name = os.path.split(pattern)
+    if not name.startswith('*.'):
+        return None
+    entry = read_manifest(directory).get(name[2:])
+    if not entry:
+        return None
+    path = os.path.join(directory, entry['path'])
+    return path if os.path.exists(path) else None
+
+
+def _run(path):
+    """'<time>' of a '<time>.<format>' file: files of one run share it."""
+    return os.path.basename(path).split('.', 1)[0]
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0.0
+
+
+def latest_file(pattern):
+    """
+    Current file for `pattern`: the manifest entry for its format when there
+    is one, else the newest match. A list of patterns names the formats of
+    one table in order of preference, e.g. the Arrow snapshot before the
+    CSV. A preferred file is only used when it comes from the same run as
+    the newest file of any format (or is that file); a later run that wrote
+    only a CSV is not hidden behind an older Arrow snapshot.
+    """
+    found = []
+    for p in ([pattern] if isinstance(pattern, str) else pattern):
+        path = _manifest_file(p)
+        if not path:
+            files = glob.glob(p)
+            path = max(files, key=_mtime) if files else None
+        if path:
+            found.append(path)
+    if not found:
+        return None
+    newest = max(found, key=_mtime)
+    for path in found:
+        if _run(path) == _run(newest) or _mtime(path) >= _mtime(newest):
+            return path
+    return newest
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _csv_shape(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        return sum(1 for _ in reader), columns
+
+
+def _copy_atomic(src, dst):
+    shutil.copyfile(src, f'{dst}.tmp')
+    os.replace(f'{dst}.tmp', dst)
+
+
+def publish(tmp_path, path, rows=None, columns=None, latest=None):
+    """
+    Move a finished `tmp_path` to `path` in one rename, optionally refresh a
+    `latest` copy the same way, and record it in the directory's manifest.
+    Rows and columns are counted from CSVs when not given.
+    """
+    os.replace(tmp_path, path)
+    if latest:
+        _copy_atomic(path, latest)
+    if rows is None and path.endswith('.csv'):
+        rows, columns = _csv_shape(path)
+
+    directory = os.path.dirname(path)
+    manifest = read_manifest(directory)
+    manifest[_format(path)] = {
+        'path': os.path.basename(path),
+        'rows': rows,
+        'schema_version': SCHEMA_VERSION,
+        'sha256': file_sha256(path),
+        'published_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'columns': list(columns) if columns is not None else None,
+    }
+    tmp = os.path.join(directory, f'{MANIFEST}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+    return manifest[_format(path)]
+
+
+def read_table(path, columns=None):
+    """
+    Load a snapshot file as a DataFrame. Arrow files are memory-mapped and
+    only `columns` (those that exist) are read; CSVs fall back to usecols.
+    """
+    import pandas as pd
+    if path.endswith('.arrow'):
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        if columns is not None:
+            with pa.memory_map(path) as source:
+                names = pa.ipc.open_file(source).schema.names
+            columns = [c for c in columns if c in names]
+        return feather.read_table(path, columns=columns,
+                                  memory_map=True).to_pandas()
+    if columns is None:
+        return pd.read_csv(path)
+    wanted = set(columns)
+    return pd.read_csv(path, usecols=lambda c: c in wanted)
+
+
+def snapshot_version(path):
+    st = os.stat(path)
+    return SnapshotVersion(path, st.st_mtime_ns, st.st_size)
+
+
+class SnapshotCache(object):
+    """
+    Hold the parsed newest snapshot matching `pattern`.
+
+    `get()` only blocks on the very first load. After that it returns the
+    current snapshot immediately and, at most every `poll_seconds`, starts a
+    background check; if the version changed the new table is parsed off the
+    request path and swapped in with a single assignment.
+    """
+    def __init__(self, pattern, loader, missing_message=None,
+                 poll_seconds=SNAPSHOT_POLL_SECONDS, on_load=None):
+        self.pattern = pattern
+        self.loader = loader
+        # called as on_load(snapshot, seconds) after every (re)load
+        self.on_load = on_load
+        self.missing_message = missing_message or f'No file matches {pattern}'
+        self.poll_seconds = poll_seconds
+        self._current = None
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._checked_at = 0.0
+
+    def _find_version(self):
+        path = latest_file(self.pattern)
+        if not path:
+            return None
+        try:
+            return snapshot_version(path)
+        except FileNotFoundError:
+            # Replaced between glob and stat; the next poll will pick it up.
+            return None
+
+    @property
+    def current(self):
+        """The snapshot being served, without triggering a load or a check."""
+        return self._current
+
+    def _load(self, version):
+        start = time.perf_counter()
+        self._current = Snapshot(version, self.loader(version.path))
+        if self.on_load is not None:
+            self.on_load(self._current, time.perf_counter() - start)
+
+    def _reload(self):
+        try:
+            version = self._find_version()
+            current = self._current
+            if version is not None and (current is None
+                                        or current.version != version):
+                self._load(version)
+        except Exception:
+            # Keep serving the previous snapshot; retry on the next poll.
+            pass
+        finally:
+            self._reloading = False
+
+    def get(self):
+        current = self._current
+        if current is None:
+            with self._lock:
+                if self._current is None:
+                    version = self._find_version()
+                    if version is None:
+                        raise FileNotFoundError(self.missing_message)
+                    self._load(version)
+                    self._checked_at = time.monotonic()
+                return self._current
+
+        now = time.monotonic()
+        if now - self._checked_at >= self.poll_seconds and not self._reloading:
+            with self._lock:
+                if not self._reloading:
+                    self._checked_at = now
+                    self._reloading = True
+                    threading.Thread(target=self._reload, daemon=True).start()
+        return current
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Publish a finished file as the current snapshot')
+    parser.add_argument('src', help='finished file, e.g. a feed export')
+    parser.add_argument('dest', help='data/<table>/<time>.<format>')
+    parser.add_argument('--latest', help='also refresh this copy, e.g. latest.csv')
+    args = parser.parse_args()
+    entry = publish(args.src, args.dest, latest=args.latest)
+    print(f"Published {args.dest}: {entry['rows']} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+# SQLite storage for crawled tables.
+#
+# SqlitePipeline upserts every item into one database (SQLITE_PATH, by
+# default data/ufcstats.db) keyed by fight_id / fighter_id, so the newest
+# crawl always wins without another timestamped file to pick from. The
+# read helpers below let the API answer point lookups from the indexes
+# instead of loading whole snapshots. Nothing here imports Scrapy.
+
+import json
+import os
+import sqlite3
+from collections import namedtuple
+
+# `key` is the primary key (the upsert conflict target); every entry of
+# `indexes` is a tuple of columns for one secondary index.
+Table = namedtuple('Table', ['name', 'key', 'columns', 'indexes'])
+
+
+def connect(path, readonly=False):
+    if readonly:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    else:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = sqlite3.connect(path)
+        # Readers (the API) are not blocked while a crawl writes
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def ensure_table(conn, table):
+    columns = ', '.join(f'"{c}"' for c in table.columns)
+    key = ', '.join(f'"{c}"' for c in table.key)
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{table.name}" '
+                 f'({columns}, PRIMARY KEY ({key}))')
+    # Columns added to an item since the table was created
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info("{table.name}")')}
+    for c in table.columns:
+        if c not in existing:
+            conn.execute(f'ALTER TABLE "{table.name}" ADD COLUMN "{c}"')
+    for index in table.indexes:
+        name = f'idx_{table.name}_{"_".join(index)}'
+        cols = ', '.join(f'"{c}"' for c in index)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" '
+                     f'ON "{table.name}" ({cols})')
+
+
+def _value(value):
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value)
+    return value
+
+
+def upsert(conn, table, rows):
+    """Insert `rows` (dicts), replacing the non-key columns on conflict."""
+    columns = ', '.join(f'"{c}"' for c in table.columns)
+    params = ', '.join('?' for _ in table.columns)
+    key = ', '.join(f'"{c}"' for c in table.key)
+    updates = ', '.join(f'"{c}" = excluded."{c}"'
+                        for c in table.columns if c not in table.key)
+    conn.executemany(
+        f'INSERT INTO "{table.name}" ({columns}) VALUES ({params}) '
+        f'ON CONFLICT ({key}) DO UPDATE SET {updates}',
+        [[_value(row.get(c)) for c in table.columns] for row in rows])
+
+
+def db_version(path):
+    """Changes whenever the database (or its write-ahead log) is written."""
+    version = []
+    for p in (path, f'{path}-wal'):
+        try:
+            st = os.stat(p)
+            version.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            version.append(None)
+    return (path,) + tuple(version)
+
+
+def is_empty(conn, table):
+    return conn.execute(f'SELECT 1 FROM "{table}" LIMIT 1').fetchone() is None
+
+
+def fetch_one(conn, table, column, value):
+    row = conn.execute(f'SELECT * FROM "{table}" WHERE "{column}" = ? LIMIT 1',
+                       (value,)).fetchone()
+    return dict(row) if row is not None else None
+
+
+def bouts_for(conn, table, fighter_id):
+    """Rows of a fights/upcoming table where `fighter_id` is in either corner."""
+    # Answered from the two fighter_N_id indexes (OR optimisation)
+    rows = conn.execute(
+        f'SELECT * FROM "{table}" WHERE fighter_1_id = ? OR fighter_2_id = ? '
+        'ORDER BY rowid', (fighter_id, fighter_id)).fetchall()
+    return [dict(r) for r in rows]
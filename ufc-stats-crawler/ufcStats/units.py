@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+# Numeric versions of the fighter profile strings, computed once at crawl
+# time so consumers don't have to re-parse them:
+#
+#     height  5' 11"       -> height_cm  180.34
+#     reach   72"          -> reach_cm   182.88
+#     weight  155 lbs.     -> weight_lbs 155.0
+#     dob     Jul 14, 1988 -> age        (whole years on the crawl date)
+#
+# ufcstats.com shows '--' for unknown values; those become None.
+
+import re
+from datetime import datetime
+
+STANCES = ('Orthodox', 'Southpaw', 'Switch')
+# One-hot stance columns, matching the prediction model's Stance_* features
+# (anything else, including a missing stance, counts as Open Stance)
+STANCE_FIELDS = {
+    'stance_orthodox': 'Orthodox',
+    'stance_southpaw': 'Southpaw',
+    'stance_switch': 'Switch',
+    'stance_open_stance': None,
+}
+
+_HEIGHT = re.compile(r"(\d+)'\s*(\d+(?:\.\d+)?)")
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+
+
+def height_cm(value):
+    m = _HEIGHT.search(value or '')
+    if m is None:
+        return None
+    return round(float(m.group(1)) * 30.48 + float(m.group(2)) * 2.54, 2)
+
+
+def reach_cm(value):
+    m = _NUMBER.search(value or '')
+    return round(float(m.group()) * 2.54, 2) if m else None
+
+
+def weight_lbs(value):
+    m = _NUMBER.search(value or '')
+    return float(m.group()) if m else None
+
+
+def age(dob, on):
+    """Whole years between a 'Jul 14, 1988' birth date and date `on`."""
+    try:
+        born = datetime.strptime((dob or '').strip(), '%b %d, %Y').date()
+    except ValueError:
+        return None
+    return on.year - born.year - ((on.month, on.day) < (born.month, born.day))
+
+
+def stance_one_hot(stance):
+    stance = (stance or '').strip()
+    return {field: int(stance == value if value else stance not in STANCES)
+            for field, value in STANCE_FIELDS.items()}